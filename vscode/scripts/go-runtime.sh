@@ -708,8 +708,10 @@ LLENCHECK_LIMIT=100
 LLENCHECK_FILTER=true
 LLENCHECK_FAIL=true
 LLENCHECK_SUPPRESS=("ghdrcheck")
+LLENCHECK_EXCLUDE_FILES=()
 PRECOMMIT_ENABLE=false
 PRECOMMIT_FAIL=true
+LINT_DAEMON_ENABLE=false
 
 USE_RSYNC_METHOD=true
 USE_RSYNC_BINARY="rsync"
@@ -1991,7 +1993,6 @@ function xperform_build_and_deploy() {
 		P_FLAG_REBUILD=true
 		xlint_reset_results
 		xistall_ssh_key
-		xpython_exec "-m" "pip" "install" "unidiff"
 	fi
 
 	xprint "$* to $TARGET_ARCH target $P_TARGET_HYPERLINK"
@@ -2504,10 +2505,10 @@ function xlint_run_golangci_lint() {
 		"./..." ">" "$scheck" "2>&1"
 	if xis_true "$GOLANGCI_LINT_FILTER"; then
 		xexec "$P_CANFAIL" cat "$scheck" "|" "${P_LINT_DIFF_FILTER[@]}" \
-			--parse-stdin --exclude-non-prefixed --exclude-nolint
+			--parse-stdin --infer-pathspec --exclude-non-prefixed --exclude-nolint
 	else
 		xexec "$P_CANFAIL" cat "$scheck" "|" "${P_LINT_DIFF_FILTER[@]}" \
-			--parse-stdin --exclude-non-prefixed --exclude-nolint --print-all
+			--parse-stdin --infer-pathspec --exclude-non-prefixed --exclude-nolint --print-all
 	fi
 	xlint_process_result "$RED" "GOLANGCI_LINT" "$GOLANGCI_LINT_FAIL" "Golangci-lint"
 }
@@ -2540,10 +2541,10 @@ function xlint_run_staticckeck() {
 	xexec "$P_CANFAIL" "$LOCAL_STATICCHECK" "${flags[@]}" "./..." "2>&1" ">>" "$scheck"
 	if xis_true "$STATICCHECK_FILTER"; then
 		xexec "$P_CANFAIL" cat "$scheck" "|" "${P_LINT_DIFF_FILTER[@]}" \
-			--parse-stdin --exclude-non-prefixed --exclude-list="\"$STATICCHECK_SUPPRESS\""
+			--parse-stdin --infer-pathspec --exclude-non-prefixed --exclude-list="\"$STATICCHECK_SUPPRESS\""
 	else
 		xexec "$P_CANFAIL" cat "$scheck" "|" "${P_LINT_DIFF_FILTER[@]}" \
-			--parse-stdin --exclude-non-prefixed --print-all
+			--parse-stdin --infer-pathspec --exclude-non-prefixed --print-all
 	fi
 	xlint_process_result "$RED" "STATICCHECK" "$STATICCHECK_FAIL" "Staticcheck"
 }
@@ -2566,12 +2567,18 @@ function xlint_run_llencheck() {
 	if xis_ne "${#LLENCHECK_SUPPRESS[@]}" "0"; then
 		suppress=("--nolint" "$(xarray_join "," "${LLENCHECK_SUPPRESS[@]}")")
 	fi
+	local exclude=()
+	if xis_ne "${#LLENCHECK_EXCLUDE_FILES[@]}" "0"; then
+		exclude=("--exclude-files=\"$(xarray_join "," "${LLENCHECK_EXCLUDE_FILES[@]}")\"")
+	fi
+	local cache=("--cache-dir=$P_CACHEDB_DIR/diff-check")
 	if xis_true "$LLENCHECK_FILTER"; then
 		xexec "$P_CANFAIL" "${P_LINT_DIFF_FILTER[@]}" --line-length-limit="$LLENCHECK_LIMIT" \
-			--tab-width="$LLENCHECK_TABWIDTH" "${suppress[@]}" "${P_LINT_DIFF_ARGS[@]}"
+			--tab-width="$LLENCHECK_TABWIDTH" "${suppress[@]}" "${cache[@]}" "${P_LINT_DIFF_ARGS[@]}"
 	else
 		xexec "$P_CANFAIL" "${P_LINT_DIFF_FILTER[@]}" --line-length-limit="$LLENCHECK_LIMIT" \
-			--tab-width="$LLENCHECK_TABWIDTH" "${suppress[@]}" "${P_LINT_DIFF_ARGS[@]}" --print-all
+			--tab-width="$LLENCHECK_TABWIDTH" "${suppress[@]}" "${cache[@]}" "${P_LINT_DIFF_ARGS[@]}" \
+			--print-all --jobs=0 "${exclude[@]}"
 	fi
 	xlint_process_result "$RED" "LLENCHECK" "$LLENCHECK_FAIL" "Line-length-limit"
 }
@@ -2604,8 +2611,13 @@ function xlint_async_prepare() {
 	if xis_set "$GIT_COMMIT_FILTER"; then
 		export P_LINT_DIFF_ARGS+=("-c=$GIT_COMMIT_FILTER")
 	fi
-	export P_LINT_DIFF_FILTER=("${P_PYTHON_EXEC[@]}"
-		"$P_VSCODE_DIR/scripts/py-diff-check.py" "${P_LINT_DIFF_ARGS[@]}"
+	if xis_true "$LINT_DAEMON_ENABLE"; then
+		# Keep parsed diffs and lint results warm between the builds in a daemon.
+		export P_LINT_DIFF_ARGS+=("--socket=$P_TEMP_DIR/diff-check-$UID.sock")
+	fi
+	# Standard library only, skip the site packages setup.
+	export P_LINT_DIFF_FILTER=("${P_PYTHON_EXEC[@]}" "-S"
+		"$P_VSCODE_DIR/scripts/py_diff_check_run.py" "${P_LINT_DIFF_ARGS[@]}"
 	)
 }
 
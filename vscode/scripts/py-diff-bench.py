@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+# Copyright 2024 RnD Center "ELVEES", JSC
+
+#
+# Micro-benchmarks for `py-diff-check.py' and the bundled `py_unidiff.py' parser, and
+# end to end runs of `py-diff-check.py' on a synthetic git repository.
+#
+
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=bad-indentation
+# pylint: disable=too-few-public-methods
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+class Config:
+    seed = 1
+    repeat = 3
+    files = 200
+    lines = 50000
+    messages = 50000
+    sourceLines = 1000000
+    fileLines = 500
+    changedFiles = 50
+    changedLines = 20
+    diff = ''
+
+
+def load_diff_check():
+    import py_diff_check_run  # pylint: disable=import-outside-toplevel
+    return py_diff_check_run.py_diff_check
+
+
+def load_unidiff():
+    return load_diff_check().unidiff()
+
+
+def warning(message):
+    print(f'WARNING: {message}')
+
+
+def report(name, count, unit, seconds):
+    rate = count / seconds if seconds > 0 else 0
+    print(f'{name:<36} {count:>10} {unit:<8} {seconds * 1000:>10.1f} ms {rate:>14.0f} {unit}/s')
+
+
+def report_memory(name, count, unit, size):
+    print(f'{name:<36} {count:>10} {unit:<8} {size / 1024:>10.1f} KiB')
+
+
+def measure_memory(function):
+    # Size of the objects retained by the value returned from `function`.
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = function()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+
+def measure_peak(function):
+    # Peak of memory allocated while `function` runs.
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def measure(function):
+    best = None
+    for _ in range(Config.repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def synthetic_diff(files, lines):
+    # Unified diff of `files` Go files with `lines` diff lines in total, one third of
+    # them are added lines grouped into hunks of varying size.
+    rnd = random.Random(Config.seed)
+    output = io.StringIO()
+    per_file = max(lines // files, 8)
+    for index in range(files):
+        path = f'pkg/mod{index % 17}/file{index}.go'
+        output.write(f'diff --git a/{path} b/{path}\n')
+        output.write(f'index 0123456..89abcde 100644\n--- a/{path}\n+++ b/{path}\n')
+        source = 1
+        target = 1
+        written = 0
+        while written < per_file:
+            body = []
+            added = 0
+            removed = 0
+            context = 0
+            for _ in range(rnd.randint(4, 24)):
+                kind = rnd.random()
+                text = f'\tvalue{rnd.randint(0, 999)} := compute(ctx, {rnd.randint(0, 99)})'
+                if kind < 0.34:
+                    body.append('+' + text)
+                    added += 1
+                elif kind < 0.5:
+                    body.append('-' + text)
+                    removed += 1
+                else:
+                    body.append(' ' + text)
+                    context += 1
+            output.write(f'@@ -{source},{removed + context} +{target},{added + context} @@'
+                         ' func example() {\n')
+            output.write('\n'.join(body) + '\n')
+            source += removed + context + rnd.randint(5, 40)
+            target += added + context + rnd.randint(5, 40)
+            written += len(body) + 1
+    return output.getvalue()
+
+
+def synthetic_messages(patched, count):
+    # golangci-lint/staticcheck like output, roughly every fourth message hits the diff.
+    rnd = random.Random(Config.seed)
+    checks = ['SA1019', 'ST1003', 'U1000', 'errcheck', 'govet']
+    messages = []
+    for _ in range(count):
+        if patched and rnd.random() < 0.25:
+            path, line = patched[rnd.randrange(len(patched))]
+        else:
+            path = f'pkg/mod{rnd.randint(0, 16)}/file{rnd.randint(0, Config.files)}.go'
+            line = rnd.randint(1, 5000)
+        messages.append(f'{path}:{line}:{rnd.randint(1, 80)}: message text '
+                        f'for line {line} ({rnd.choice(checks)})\n')
+    return messages
+
+
+def legacy_in_diff(messages, dictionary):
+    # Original lookup: per-call regular expression and `file:line:` string keys.
+    found = 0
+    for message in messages:
+        words = message.split()
+        match = re.match(r'([^:]*):([0-9]+):([0-9]+):', words[0])
+        if match:
+            words[0] = f'{match.group(1)}:{match.group(2)}:'
+        for word in words:
+            if word in dictionary:
+                found += 1
+                break
+    return found
+
+
+def bench_suppress():
+    diff_check = load_diff_check()
+    git_diff = diff_check.GitDiff.__new__(diff_check.GitDiff)
+    git_diff.change_list = []
+    git_diff.patch_lines = None
+    git_diff.process_patch_set(load_unidiff().PatchSet(
+        io.StringIO(synthetic_diff(Config.files, Config.lines))))
+    patched = [(change_set.file_path, line.target_line_no)
+               for change_set in git_diff.change_list for line in change_set.appended_lines]
+    messages = synthetic_messages(patched, Config.messages)
+
+    dictionary, size = measure_memory(
+        lambda: {f'{path}:{line}:': True for path, line in patched})
+    report_memory('patched lines (legacy)', len(patched), 'lines', size)
+    patch_lines, size = measure_memory(lambda: diff_check.GitPatchLines(git_diff))
+    report_memory('GitPatchLines', len(patched), 'lines', size)
+
+    def current_in_diff():
+        in_patch = diff_check.WarningsSuppressor.in_patch
+        found = 0
+        for message in messages:
+            if in_patch(message.rstrip('\r\n'), patch_lines):
+                found += 1
+        return found
+
+    if legacy_in_diff(messages, dictionary) != current_in_diff():
+        warning('legacy and current lookups disagree')
+    report('in_dictionary (legacy)', len(messages), 'lines',
+           measure(lambda: legacy_in_diff(messages, dictionary)))
+    report('in_patch', len(messages), 'lines', measure(current_in_diff))
+
+    def suppressor_run():
+        diff_check.Config.excludeList = 'SA1019'
+        stdin = sys.stdin
+        sys.stdin = io.StringIO(''.join(messages))
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                diff_check.WarningsSuppressor(git_diff).run()
+        finally:
+            sys.stdin = stdin
+
+    report('WarningsSuppressor.run', len(messages), 'lines', measure(suppressor_run))
+    return
+
+
+def synthetic_go_source(count, seed=None):
+    # Go like source of `count` lines, a few percent of them trigger the builtin checks.
+    rnd = random.Random(Config.seed if seed is None else seed)
+    templates = [
+        (40, '\tvalue{0} := compute(ctx, {1})'),
+        (20, '\tif err != nil {{\n\t\treturn nil, err\n\t}}'),
+        (15, '\t// {0} is a comment line of moderate length describing the code below it'),
+        (10, '\tresult.Field{0} = append(result.Field{0}, item{1}.Value)'),
+        (5, ''),
+        (2, '\t\treturn fmt.Errorf("Failed to process item {0}: %w", err)'),
+        (2, '\t\treturn errors.Wrap(err, "unable to load {0}")'),
+        (2, '\titems{0} := []string{{}}'),
+        (2, '\tname{0} := ""'),
+        (1, '\tconfig := Config{{Name: "x", Parent: nil}}'),
+        (1, '\t\t\t\tlog.Printf("%s: %d items processed in {0} with a very long message text", '
+            'name, {1})'),
+    ]
+    weights = [weight for weight, _ in templates]
+    lines = ['package main', '', 'import (', '\t"errors"', '', '\t"fmt"', ')', '']
+    while len(lines) < count:
+        template = rnd.choices(templates, weights)[0][1]
+        lines.extend(template.format(rnd.randint(0, 999), rnd.randint(0, 99)).split('\n'))
+    return '\n'.join(lines[:count]) + '\n'
+
+
+def bench_lint():
+    diff_check = load_diff_check()
+    diff_check.Config.lineLengthLimit = 100
+    diff_check.Config.tabWidth = 4
+    diff_check.Config.noLintList = ['']
+    data = synthetic_go_source(Config.sourceLines).encode('utf-8')
+    lines = data.decode('utf-8').split('\n')[:-1]
+    runner = diff_check.BuiltinLintersRunner(None)
+    runner.file_path = 'main.go'
+
+    def process_diff():
+        runner.output_lines = []
+        for runner.line_index, runner.line_text in enumerate(lines, 1):
+            runner.process_diff()
+
+    def process_file():
+        runner.output_lines = []
+        runner.in_imports = 0
+        runner.in_hdrcheck = 0
+        runner.process_file(data, True, True)
+
+    report('process_diff', len(lines), 'lines', measure(process_diff))
+    report('process_file', len(lines), 'lines', measure(process_file))
+    print(f'{"messages":<36} {len(runner.output_lines):>10}')
+
+    # The whole file as `--print-all' sees it, read and decoded or memory mapped.
+    mmap_min_size = diff_check.MMAP_MIN_SIZE
+    with tempfile.TemporaryDirectory() as directory:
+        task = (os.path.join(directory, 'main.go'), None)
+        with open(task[0], 'wb') as file:
+            file.write(data)
+        for name, min_size in [('process_task (read)', len(data) + 1),
+                               ('process_task (mmap)', 0)]:
+            diff_check.MMAP_MIN_SIZE = min_size
+            report(name, len(lines), 'lines', measure(lambda: runner.process_task(task)))
+            report_memory(f'{name} (peak)', len(lines), 'lines',
+                          measure_peak(lambda: runner.process_task(task)))
+    diff_check.MMAP_MIN_SIZE = mmap_min_size
+    return
+
+
+def load_diff():
+    # Real diff given with --diff (e.g. `git diff HEAD~100 > large.diff`) or a synthetic one.
+    if Config.diff:
+        with open(Config.diff, 'r', encoding='utf-8', newline='') as file:
+            return file.read()
+    return synthetic_diff(Config.files, Config.lines)
+
+
+def bench_parse():
+    unidiff = load_unidiff()
+    text = load_diff()
+    count = text.count('\n')
+    modes = [
+        ('PatchSet', {}),
+        ('PatchSet(metadata_only)', {'metadata_only': True}),
+        ('PatchSet(added_ranges_only)', {'added_ranges_only': True}),
+    ]
+    for name, options in modes:
+        report(name, count, 'lines',
+               measure(lambda options=options: unidiff.PatchSet(io.StringIO(text), **options)))
+    # py-diff-check reads the diff as bytes straight from the git pipe
+    data = text.encode('utf-8')
+    for name, options in modes:
+        report(f'{name} bytes', count, 'lines',
+               measure(lambda options=options: unidiff.PatchSet(
+                   io.BytesIO(data), encoding='utf-8', **options)))
+    lines = list(io.StringIO(text))
+    report_memory('PatchSet (peak)', count, 'lines',
+                  measure_peak(lambda: unidiff.PatchSet(lines)))
+    report_memory('PatchSet.iter_files (peak)', count, 'lines',
+                  measure_peak(lambda: consume(unidiff.PatchSet.iter_files(lines))))
+    report_memory('PatchSet.iter_hunks (peak)', count, 'lines',
+                  measure_peak(lambda: consume(unidiff.PatchSet.iter_hunks(lines))))
+    return
+
+
+def bench_memory():
+    unidiff = load_unidiff()
+    text = load_diff()
+    count = text.count('\n')
+    patch_set, size = measure_memory(lambda: unidiff.PatchSet(io.StringIO(text)))
+    report_memory('PatchSet (retained)', count, 'lines', size)
+    lines = sum(len(hunk) for patched_file in patch_set for hunk in patched_file)
+    if lines > 0:
+        print(f'{"bytes per diff line":<36} {lines:>10} {"lines":<8} {size / lines:>10.1f} B')
+    return
+
+
+def git(directory, *arguments):
+    subprocess.run(['git', '-C', directory, '-c', 'user.name=bench',
+                    '-c', 'user.email=bench@localhost', *arguments],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+def synthetic_repository(directory):
+    # Git repository of `files` Go sources, the last commit inserts `changed_lines` lines
+    # into `changed_files` of them. Returns the inserted (path, line) locations.
+    rnd = random.Random(Config.seed)
+    git(directory, 'init', '-q')
+    sources = {}
+    for index in range(Config.files):
+        path = f'pkg/mod{index % 17}/file{index}.go'
+        sources[path] = synthetic_go_source(Config.fileLines, index).split('\n')[:-1]
+        os.makedirs(os.path.join(directory, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(directory, path), 'w', encoding='utf-8') as file:
+            file.write('\n'.join(sources[path]) + '\n')
+    git(directory, 'add', '-A')
+    git(directory, 'commit', '-q', '-m', 'base')
+    patched = []
+    changed = rnd.sample(sorted(sources), min(Config.changedFiles, len(sources)))
+    for number, path in enumerate(changed):
+        lines = sources[path]
+        inserted = synthetic_go_source(Config.changedLines + 8, Config.files + number)
+        inserted = inserted.split('\n')[8:-1]
+        # Keep the header and the imports block of synthetic_go_source() in place.
+        targets = set(rnd.sample(range(8, len(lines) + len(inserted)), len(inserted)))
+        merged = []
+        source = iter(lines)
+        additions = iter(inserted)
+        for target in range(len(lines) + len(inserted)):
+            if target in targets:
+                merged.append(next(additions))
+                patched.append((path, target + 1))
+            else:
+                merged.append(next(source))
+        with open(os.path.join(directory, path), 'w', encoding='utf-8') as file:
+            file.write('\n'.join(merged) + '\n')
+    git(directory, 'commit', '-q', '-a', '-m', 'change')
+    return patched
+
+
+def run_diff_check(directory, arguments, stdin_path, profile_path):
+    # One py-diff-check.py run, returns the wall time, the output lines and the profile.
+    command = [sys.executable, '-S', os.path.join(SCRIPTS_DIR, 'py_diff_check_run.py'),
+               '-c', 'HEAD', '-l', '100', '-t', '4', f'--profile={profile_path}', *arguments]
+    with contextlib.ExitStack() as stack:
+        # A pipe nobody writes to: py-diff-check.py takes a readable STDIN for --parse-stdin.
+        stdin = subprocess.PIPE
+        if stdin_path:
+            stdin = stack.enter_context(open(stdin_path, 'rb'))
+        start = time.perf_counter()
+        with subprocess.Popen(command, cwd=directory, stdin=stdin,
+                              stdout=subprocess.PIPE) as proc:
+            output = proc.stdout.read()
+            proc.wait()
+        elapsed = time.perf_counter() - start
+    with open(profile_path, 'r', encoding='utf-8') as file:
+        profile = json.loads(file.readlines()[-1])
+    return elapsed, output.count(b'\n'), profile
+
+
+def bench_pipeline():
+    # End to end runs of py-diff-check.py on a synthetic repository, with the per phase
+    # times of its --profile report (best of the runs for each).
+    with tempfile.TemporaryDirectory() as directory:
+        repository = os.path.join(directory, 'repo')
+        os.makedirs(repository)
+        patched = synthetic_repository(repository)
+        messages_path = os.path.join(directory, 'lint.log')
+        with open(messages_path, 'w', encoding='utf-8') as file:
+            file.writelines(synthetic_messages(patched, Config.messages))
+        profile_path = os.path.join(directory, 'profile.jsonl')
+        total_lines = Config.files * Config.fileLines
+        modes = [
+            ('BuiltinLintersRunner (diff)', [], None, len(patched)),
+            ('BuiltinLintersRunner (all)', ['--print-all'], None, total_lines),
+            ('BuiltinLintersRunner (all, jobs)', ['--print-all', '--jobs=0'], None,
+             total_lines),
+            ('WarningsSuppressor', ['--parse-stdin', '--exclude-list=SA1019'],
+             messages_path, Config.messages),
+        ]
+        for name, arguments, stdin_path, count in modes:
+            best = None
+            phases = {}
+            output_lines = 0
+            for _ in range(Config.repeat):
+                elapsed, output_lines, profile = run_diff_check(
+                    repository, arguments, stdin_path, profile_path)
+                best = elapsed if best is None else min(best, elapsed)
+                for phase, seconds in profile['phases'].items():
+                    phases[phase] = min(phases.get(phase, seconds), seconds)
+            report(name, count, 'lines', best)
+            for phase, seconds in sorted(phases.items()):
+                report(f'  {phase}', count, 'lines', seconds)
+            print(f'{"  messages":<36} {output_lines:>10}')
+    return
+
+
+BENCHMARKS = {
+    'lint': bench_lint,
+    'memory': bench_memory,
+    'parse': bench_parse,
+    'pipeline': bench_pipeline,
+    'suppress': bench_suppress,
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(__file__),
+        description='Benchmark py-diff-check.py and py_unidiff.py',
+    )
+    parser.add_argument(
+        'benchmarks',
+        help=f'Benchmarks to run: {", ".join(BENCHMARKS)} (default: all)',
+        nargs='*',
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        help='Report the best of N runs',
+        type=int,
+        default=Config.repeat,
+    )
+    parser.add_argument(
+        '-f', '--files',
+        help='Number of files in the synthetic diff',
+        type=int,
+        default=Config.files,
+    )
+    parser.add_argument(
+        '-l', '--lines',
+        help='Number of lines in the synthetic diff',
+        type=int,
+        default=Config.lines,
+    )
+    parser.add_argument(
+        '-m', '--messages',
+        help='Number of synthetic linter messages',
+        type=int,
+        default=Config.messages,
+    )
+    parser.add_argument(
+        '-g', '--go-lines',
+        help='Number of lines in the synthetic Go source',
+        type=int,
+        default=Config.sourceLines,
+    )
+    parser.add_argument(
+        '-L', '--file-lines',
+        help='Number of lines per file of the synthetic repository',
+        type=int,
+        default=Config.fileLines,
+    )
+    parser.add_argument(
+        '-C', '--changed-files',
+        help='Number of files the last commit of the synthetic repository changes',
+        type=int,
+        default=Config.changedFiles,
+    )
+    parser.add_argument(
+        '-n', '--changed-lines',
+        help='Number of lines the last commit inserts into each changed file',
+        type=int,
+        default=Config.changedLines,
+    )
+    parser.add_argument(
+        '-d', '--diff',
+        help='Use the diff from the file instead of a synthetic one',
+        type=str,
+        default=Config.diff,
+    )
+    arguments = parser.parse_args()
+    Config.repeat = arguments.repeat
+    Config.files = arguments.files
+    Config.lines = arguments.lines
+    Config.messages = arguments.messages
+    Config.sourceLines = arguments.go_lines
+    Config.fileLines = arguments.file_lines
+    Config.changedFiles = arguments.changed_files
+    Config.changedLines = arguments.changed_lines
+    Config.diff = arguments.diff
+    for name in arguments.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark: {name}')
+    return arguments.benchmarks or list(BENCHMARKS)
+
+
+def main():
+    for name in parse_arguments():
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,15 +14,54 @@
 # pylint: disable=too-many-branches
 # pylint: disable=too-many-statements
 # pylint: disable=too-many-instance-attributes
+# pylint: disable=import-outside-toplevel
 
+# Modules only some of the runs need are imported where used, as are the bundled modules
+# next to this script, they take a good part of the startup time.
 import argparse
-import io
+import array
+import bisect
+import collections
+import contextlib
 import os
 import re
-import select
-import subprocess
 import sys
-import unidiff
+import time
+
+
+def unidiff():
+    import py_unidiff
+    return py_unidiff
+
+
+def pyprocess():
+    # Failed commands are reported as the other errors are.
+    import py_process
+    py_process.report = error
+    return py_process
+
+# `file:line:` or `file:line:column:` location at the start of a linter message
+RE_LOCATION_HEAD = re.compile(r'\s*([^\s:]*):([0-9]+):(?:[0-9]+:|(?=\s|$))')
+# `file:line:` location as a separate word of a linter message
+RE_LOCATION_WORD = re.compile(r'(?<!\S)([^\s:]*):([0-9]+):(?=\s|$)')
+RE_LOCATION_PREFIX = re.compile(r'([^:]*):([0-9]+):')
+RE_LOCATION_COLUMN = re.compile(r'([^:]*):([0-9]+):([0-9]+):')
+RE_CHECK_SUFFIX = re.compile(r'^(.*)\s+\(\w+\)$')
+RE_CHECK_NAME = re.compile(r'\s+\((\w+)\)$')
+# Triggers of the per-line builtin checks, so one scan tells which checks may report on the
+# line. Every alternative starts with a literal, which lets `re' skip to the candidate
+# characters quickly. The checks see lines with unexpanded tabs, so `:[ \t]*n[ \t]*i[ \t]*l'
+# is a nil field initialization once the spaces are removed.
+RE_LINE_CHECKS = re.compile(
+    r'fmt\.Error|errors\.(?:Wrap|New|Error)|:(?:[ \t]*n[ \t]*i[ \t]*l|=)')
+RE_LINE_CHECKS_BYTES = re.compile(RE_LINE_CHECKS.pattern.encode())
+# wrapcheck triggers in the order of preference
+WRAPCHECK_LIST = ['fmt.'+'Error', 'errors.'+'Wrap', 'errors.'+'New', 'errors.'+'Error']
+DEPRECHECK_LIST = ['errors.'+'Wrap']
+# Files of this size and larger are memory mapped rather than read and decoded as a whole.
+MMAP_MIN_SIZE = 256 * 1024
+# Go allows no imports after other top-level declarations.
+TOP_LEVEL_DECLARATIONS = (b'func ', b'func(', b'type ', b'var ', b'const ')
 
 
 class Config:
@@ -37,7 +76,18 @@ class Config:
     excludeNolintWarns = False
     printAll = False
     noLintList = []
+    jobs = 1
+    cacheDir = ""
+    daemonSocket = ""
+    clientSocket = ""
+    pathspecs = []
+    inferPathspecs = False
+    excludeFiles = ""
+    outputFormat = "text"
+    profile = ""
     exitCode = 0
+    # Stream of the messages below, STDOUT unless the daemon serves a request.
+    output = None
 
 
 class Colors:
@@ -61,24 +111,24 @@ class Colors:
 
 def debug(message):
     if Config.debugLevel > 0:
-        print(f'DEBUG: {message}')
+        print(f'DEBUG: {message}', file=Config.output)
 
 
 def verbose(message):
     if Config.verboseLevel > 0:
-        print(f'VERBOSE: {message}')
+        print(f'VERBOSE: {message}', file=Config.output)
 
 
 def warning(message):
-    print(f'{Colors.yellow}WARNING: {message}{Colors.nc}')
+    print(f'{Colors.yellow}WARNING: {message}{Colors.nc}', file=Config.output)
 
 
 def error(message):
-    print(f'{Colors.red}ERROR: {message}{Colors.nc}')
+    print(f'{Colors.red}ERROR: {message}{Colors.nc}', file=Config.output)
 
 
 def fatal(message):
-    print(f'{Colors.red}FATAL: {message}{Colors.nc}')
+    print(f'{Colors.red}FATAL: {message}{Colors.nc}', file=Config.output)
     sys.exit()
 
 
@@ -87,11 +137,25 @@ def remove_from_dict(dictionary, values):
         del dictionary[value]
 
 
-def parse_arguments():
+class HelpFormatter(argparse.HelpFormatter):
+    # The default one asks shutil for the terminal width, and importing shutil imports the
+    # compression modules as well.
+    def __init__(self, prog):
+        columns = os.environ.get('COLUMNS', '')
+        if not columns.isdigit():
+            try:
+                columns = os.get_terminal_size().columns
+            except OSError:
+                columns = 80
+        super().__init__(prog, width=int(columns) - 2)
+
+
+def parse_arguments(args=None):
     parser = argparse.ArgumentParser(
         prog=os.path.basename(__file__),
         description='Update Gerrit Git tags & branches',
-        epilog='Update Gerrit Git tags & branches'
+        epilog='Update Gerrit Git tags & branches',
+        formatter_class=HelpFormatter,
     )
     parser.add_argument(
         '-s', '--silent',
@@ -177,7 +241,72 @@ def parse_arguments():
         type=str,
         default="",
     )
-    arguments, unknown_args = parser.parse_known_args()
+    parser.add_argument(
+        '-j', '--jobs',
+        help='Run builtin linters in N worker processes (0 - one per CPU)',
+        required=False,
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        '-k', '--cache-dir',
+        help='Cache builtin linters results of unchanged files in the directory',
+        required=False,
+        type=str,
+        default="",
+    )
+    parser.add_argument(
+        '-P', '--pathspec',
+        help='Restrict `git diff` to the path or Go package pattern (`./x`, `./x/...`)',
+        required=False,
+        action='append',
+        default=[],
+    )
+    parser.add_argument(
+        '-i', '--infer-pathspec',
+        help='Restrict `git diff` to the files named in STDIN, which is read in full first',
+        required=False,
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '-f', '--exclude-files',
+        help='Comma separated globs of files `--print-all` skips (`vendor/,*.pb.go`)',
+        required=False,
+        type=str,
+        default="",
+    )
+    parser.add_argument(
+        '-F', '--format',
+        help='Print messages as text, JSON Lines or a SARIF log',
+        required=False,
+        choices=['text', 'jsonl', 'sarif'],
+        default='text',
+    )
+    parser.add_argument(
+        '-T', '--profile',
+        help='Report phase timings and counters as JSON to STDERR, or append them to the file',
+        required=False,
+        nargs='?',
+        const='-',
+        default="",
+    )
+    parser.add_argument(
+        '-D', '--daemon',
+        help='Serve requests of --socket clients on the Unix socket',
+        required=False,
+        type=str,
+        default="",
+    )
+    parser.add_argument(
+        '-S', '--socket',
+        help='Pass the request to the daemon on the Unix socket, without one start it ' +
+        'and run locally, as when it is busy',
+        required=False,
+        type=str,
+        default="",
+    )
+    arguments, unknown_args = parser.parse_known_args(args)
     Config.debugLevel = arguments.debug
     # debug(f'arguments={arguments}')
     # debug(f'unknown arguments={unknown_args}')
@@ -198,166 +327,823 @@ def parse_arguments():
     Config.excludeNolintWarns = arguments.exclude_nolint
     Config.printAll = arguments.print_all
     Config.noLintList = arguments.nolint.split(',')
+    Config.jobs = arguments.jobs if arguments.jobs > 0 else os.cpu_count() or 1
+    Config.cacheDir = arguments.cache_dir
+    Config.pathspecs = [GitDiff.pathspec(path) for path in arguments.pathspec]
+    Config.inferPathspecs = arguments.infer_pathspec
+    Config.excludeFiles = arguments.exclude_files
+    Config.outputFormat = arguments.format
+    Config.profile = arguments.profile
+    Config.daemonSocket = arguments.daemon
+    Config.clientSocket = arguments.socket
     return arguments
 
 
-class Shell:
-    def __init__(self, params, silent=False):
+class Profile:
+    # Opt-in wall time per phase and counters of the work done, see --profile.
+    enabled = False
+    started = 0.0
+    phases = {}
+    counters = None
+
+    @staticmethod
+    def start():
+        Profile.enabled = True
+        Profile.started = time.perf_counter()
+        Profile.phases = {}
+        Profile.counters = collections.Counter()
+        if Profile.process_finished not in pyprocess().hooks:
+            pyprocess().hooks.append(Profile.process_finished)
+        return
+
+    @staticmethod
+    def process_finished(params, status, seconds):
+        # Commands run during other phases, their time is counted in those as well.
+        if not Profile.enabled:
+            return
+        Profile.phases['processes'] = Profile.phases.get('processes', 0.0) + seconds
+        Profile.counters['processes'] += 1
+        if status != 0:
+            Profile.counters['processes.failed'] += 1
+        return
+
+    @staticmethod
+    @contextlib.contextmanager
+    def phase(name):
+        if not Profile.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            Profile.phases[name] = Profile.phases.get(name, 0.0) + elapsed
+
+    @staticmethod
+    def count(name, value=1):
+        if Profile.counters is not None:
+            Profile.counters[name] += value
+        return
+
+    @staticmethod
+    def take_counters():
+        # Worker processes hand their counters over with every result.
+        counters = Profile.counters
+        if counters is not None:
+            Profile.counters = collections.Counter()
+        return counters
+
+    @staticmethod
+    def report(target):
+        summary = {
+            'time': time.time(),
+            'cwd': os.getcwd(),
+            'mode': 'suppress' if Config.parseStdin else
+                    'all' if Config.printAll else 'diff',
+            'total': round(time.perf_counter() - Profile.started, 6),
+            'phases': {name: round(elapsed, 6) for name, elapsed in Profile.phases.items()},
+            'counters': dict(sorted(Profile.counters.items())),
+        }
+        Profile.enabled = False
+        Profile.counters = None
+        import json
+        line = json.dumps(summary)
+        if target == '-':
+            print(line, file=sys.stderr, flush=True)
+        else:
+            with open(target, 'a', encoding='utf-8') as file:
+                file.write(line + '\n')
+        return
+
+
+class ShellPipe:
+    # Hand the command stdout to `consumer' as a binary pipe, so the output is processed
+    # while the command is still producing it.
+    def __init__(self, params, consumer, silent=False):
         self.params = params
         self.silent = silent
-        proc = subprocess.Popen(
-            params,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE)
-        stdout, stderr = proc.communicate()
-        self.stdout = stdout.decode()
-        self.stderr = stderr.decode()
-        self.status = proc.returncode
-        if not silent and not self.succeed():
+        with pyprocess().Process(params) as process:
+            consumer(process.pipe)
+        self.stderr = process.stderr
+        self.status = process.status
+        if not silent and not self.succeeded():
             error(f'Failed to execute: {self.params}')
             error(f'{self.stderr.strip()}')
 
-    def succeed(self):
+    def succeeded(self):
         return self.status == 0
 
-    def debug(self):
-        # debug(f'Shell params: {self.params}')
-        # debug(f'Shell stdout: {self.stdout}')
-        # debug(f'Shell stderr: {self.stderr}')
-        # debug(f'Shell status: {self.status}, succeed {self.succeed()}')
-        return
-
 
 class GitChangeSet:
-    def __init__(self, file_path, appended_lines, deleted_lines):
+    def __init__(self, file_path, appended_lines, deleted_lines, appended_ranges):
         self.file_path = file_path
         self.deleted_lines = deleted_lines
         self.appended_lines = appended_lines
+        self.appended_ranges = appended_ranges
         return
 
 
 class GitDiff:
-    def __init__(self):
+    def __init__(self, ranges_only=False, arguments=None):
+        # With `ranges_only' only appended line ranges are collected, which is all
+        # WarningsSuppressor needs, and no per-line objects are created.
+        self.ranges_only = ranges_only
         self.change_list = []
-        result = Shell(['git', 'status'])
-        if not result.succeed():
-            fatal('Unable to run \'git status\' on project')
-        if 'interactive rebase in progress' in result.stdout:
-            expr = r'interactive rebase in progress; onto ([\w]+)'
-            match = re.match(expr, result.stdout)
-            if not match:
-                fatal('Unable to get \'git rebase\' commit')
-            commit = match.group(1)
-            self.run_on_commit(commit, '', '', '')
+        self.patch_lines = None
+        if arguments is None:
+            with Profile.phase('diff_arguments'):
+                arguments = GitDiff.diff_arguments()
+        if not arguments:
+            # Empty arguments: nothing to diff, the patch is empty.
             return
-        commit = Config.gitCommit
-        self.run_on_commit(commit, '~', '', '')
+        # Parsing is done while reading the pipe, the phase includes both.
+        with Profile.phase('git_diff'):
+            result = ShellPipe(arguments, self.process_pipe)
+        if not result.succeeded():
+            fatal('Unable to run \'git diff\' on project')
         return
 
-    def run_on_commit(self, commit_in, commit_in_post, commit_out, commit_out_post):
+    @staticmethod
+    def diff_arguments():
+        # During an interactive rebase diff against the commit being rebased onto. Probe the
+        # rebase state directly, `git status' would scan the whole work tree.
+        rebase_dir = os.path.join(GitDiff.git_dir(), 'rebase-merge')
+        if os.path.exists(os.path.join(rebase_dir, 'interactive')):
+            try:
+                with open(os.path.join(rebase_dir, 'onto'), 'r', encoding='utf-8') as file:
+                    commit = file.read().strip()
+            except OSError:
+                commit = ''
+            if commit == '':
+                fatal('Unable to get \'git rebase\' commit')
+            return GitDiff.commit_arguments(commit, '', '', '')
+        commit = Config.gitCommit
+        return GitDiff.commit_arguments(commit, '~', '', '')
+
+    @staticmethod
+    def git_dir():
+        # Look for `.git' like git does, it is a file pointing to the actual directory in
+        # linked work trees and submodules. Ask git for anything unusual.
+        path = os.getcwd()
+        while 'GIT_DIR' not in os.environ:
+            dot_git = os.path.join(path, '.git')
+            if os.path.isdir(dot_git):
+                return dot_git
+            if os.path.isfile(dot_git):
+                with open(dot_git, 'r', encoding='utf-8') as file:
+                    content = file.read().strip()
+                if content.startswith('gitdir:'):
+                    return os.path.join(path, content[len('gitdir:'):].strip())
+                break
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        result = pyprocess().Shell(['git', 'rev-parse', '--git-dir'])
+        if not result.succeeded():
+            fatal('Unable to find git directory of project')
+        return result.stdout.strip()
+
+    @staticmethod
+    def toplevel():
+        result = pyprocess().Shell(['git', 'rev-parse', '--show-toplevel'])
+        if not result.succeeded():
+            fatal('Unable to find top-level directory of project')
+        return os.path.realpath(result.stdout.rstrip('\n'))
+
+    @staticmethod
+    def commit_arguments(commit_in, commit_in_post, commit_out, commit_out_post):
         arguments = ['git', 'diff']
         if commit_in != "":
             arguments.append(commit_in + commit_in_post)
         if commit_out != "":
             arguments.append(commit_out + commit_out_post)
-        result = Shell(arguments)
-        if not result.succeed():
-            fatal('Unable to run \'git diff\' on project')
-        text = io.StringIO(result.stdout)
-        patch_set = unidiff.PatchSet(text)
+        if Config.pathspecs:
+            arguments.append('--')
+            arguments.extend(Config.pathspecs)
+        return arguments
+
+    @staticmethod
+    def pathspec(path):
+        # Go package patterns: `./x/...' is the tree under x, `./x' the files of x only.
+        if path == '...' or path.endswith('/...'):
+            return os.path.normpath(path[:-len('...')] or '.')
+        if (path == '.' or path.startswith('./')) and os.path.isdir(path):
+            directory = os.path.normpath(path)
+            return ':(glob)*' if directory == '.' else f':(glob){directory}/*'
+        return path
+
+    def get_patch_lines(self):
+        # Built on the first use only, the daemon serves many requests from one diff.
+        if self.patch_lines is None:
+            with Profile.phase('patch_lines'):
+                self.patch_lines = GitPatchLines(self)
+        return self.patch_lines
+
+    def process_pipe(self, pipe):
+        self.process_patch_set(unidiff().PatchSet.iter_files(
+            pipe, encoding='utf-8', added_ranges_only=self.ranges_only))
+        return
+
+    def process_patch_set(self, patch_set):
         for patched_file in patch_set:
-            appended_lines = [line for hunk in patched_file for line in hunk
+            appended_lines = []
+            appended_ranges = []
+            for hunk in patched_file:
+                if hunk.added_ranges is not None:
+                    appended_ranges.extend(hunk.added_ranges)
+                    continue
+                hunk_lines = [line for line in hunk
                               if line.is_added and line.value.strip() != '']
+                appended_lines.extend(hunk_lines)
+                appended_ranges.extend(self.line_ranges(hunk_lines))
             # debug(f'{appended_lines}')
             file_path = patched_file.path
-            change_set = GitChangeSet(file_path, appended_lines, None)
+            change_set = GitChangeSet(file_path, appended_lines, None, appended_ranges)
             self.change_list.append(change_set)
+            Profile.count('diff.files')
+            Profile.count('diff.ranges', len(appended_ranges))
         return
 
+    @staticmethod
+    def line_ranges(lines):
+        # Collapse lines with consecutive target numbers into inclusive (start, end) ranges.
+        ranges = []
+        for line in lines:
+            line_no = line.target_line_no
+            if ranges and ranges[-1][1] == line_no - 1:
+                ranges[-1] = (ranges[-1][0], line_no)
+            else:
+                ranges.append((line_no, line_no))
+        return ranges
+
+
+class GitDiffCache:
+    # Parsed diffs kept by the daemon. A diff stays valid while `git diff --raw' gives the
+    # same output and none of the files listed there changed size or mtime.
+    size = 8
 
-class GitFiles:
     def __init__(self):
-        config = Shell(['git', 'ls-tree', '-r', 'master', '--name-only'])
-        if not config.succeed():
+        self.diffs = {}
+        self.toplevels = {}
+        return
+
+    def get(self, ranges_only):
+        with Profile.phase('diff_arguments'):
+            arguments = GitDiff.diff_arguments()
+        with Profile.phase('diff_state'):
+            toplevel = self.toplevels.get(os.getcwd())
+            if toplevel is None:
+                toplevel = self.toplevels[os.getcwd()] = GitDiff.toplevel()
+            state = GitDiffCache.state(arguments, toplevel)
+        key = (os.getcwd(), ranges_only, tuple(arguments), state)
+        git_diff = self.diffs.get(key)
+        if git_diff is not None:
+            debug('Using cached git diff')
+            Profile.count('diff.cached')
+            return git_diff
+        git_diff = GitDiff(ranges_only, arguments)
+        if len(self.diffs) >= GitDiffCache.size:
+            del self.diffs[next(iter(self.diffs))]
+        self.diffs[key] = git_diff
+        return git_diff
+
+    @staticmethod
+    def state(arguments, toplevel):
+        # The `--raw' paths are relative to the top-level directory, not to the current one.
+        result = pyprocess().Shell(arguments[:2] + ['--raw', '-z'] + arguments[2:])
+        if not result.succeeded():
             fatal('Unable to run \'git diff\' on project')
-        self.files = config.stdout.split('\n')
+        # `:modes blobs status' NUL path NUL, with a second path for copies and renames
+        fields = result.stdout.split('\0')
+        stats = []
+        index = 0
+        while index < len(fields) - 1:
+            status = fields[index].rsplit(' ', 1)[-1]
+            count = 2 if status[:1] in ('R', 'C') else 1
+            for file_path in fields[index + 1:index + 1 + count]:
+                try:
+                    stat = os.stat(os.path.join(toplevel, file_path))
+                    stats.append((file_path, stat.st_mtime_ns, stat.st_size))
+                except OSError:
+                    stats.append((file_path, None, None))
+            index += 1 + count
+        return result.stdout, tuple(stats)
+
+
+class GitFiles:
+    # Paths of the index, yielded while `git ls-files' is still listing them.
+    def __init__(self, exclude_files=""):
+        self.params = ['git', 'ls-files', '-z', '--cached']
+        self.exclude = GitFiles.exclude_pattern(exclude_files)
+        return
+
+    @staticmethod
+    def exclude_pattern(exclude_files):
+        # `dir/' skips a directory at any depth, a glob without `/' matches base names.
+        import fnmatch
+        patterns = []
+        for glob in exclude_files.split(','):
+            glob = glob.strip()
+            if glob == "":
+                continue
+            if glob.endswith('/'):
+                patterns.append(f'(?:.*/)?{fnmatch.translate(glob + "*")}')
+            elif '/' not in glob:
+                patterns.append(f'(?:.*/)?{fnmatch.translate(glob)}')
+            else:
+                patterns.append(fnmatch.translate(glob))
+        if not patterns:
+            return None
+        return re.compile('|'.join(patterns))
+
+    def __iter__(self):
+        with pyprocess().Process(self.params) as process:
+            for path in process.records(b'\0', None):
+                file_path = os.fsdecode(path)
+                if self.exclude is None or not self.exclude.match(file_path):
+                    yield file_path
+        if process.status != 0:
+            error(f'{process.stderr.strip()}')
+            fatal('Unable to run \'git ls-files\' on project')
+        return
 
 
 class GitPatchLines:
     def __init__(self, git_diff):
-        self.patched_lines = {}
+        # Per file sorted arrays of appended range starts and ends, so memory scales with
+        # the number of hunks rather than with the number of appended lines.
+        file_ranges = {}
         for change_set in git_diff.change_list:
-            file_path = change_set.file_path
-            for line in change_set.appended_lines:
-                key = f'{file_path}:{line.target_line_no}:'
-                self.patched_lines[key] = True
+            file_path = sys.intern(change_set.file_path)
+            file_ranges.setdefault(file_path, []).extend(change_set.appended_ranges)
+        self.patched_ranges = {}
+        for file_path, ranges in file_ranges.items():
+            ranges.sort()
+            starts = array.array('l', [start for start, _ in ranges])
+            ends = array.array('l', [end for _, end in ranges])
+            self.patched_ranges[file_path] = (starts, ends)
         return
 
+    def contains(self, file_path, line_no):
+        ranges = self.patched_ranges.get(file_path)
+        if ranges is None:
+            return False
+        starts, ends = ranges
+        index = bisect.bisect_right(starts, line_no) - 1
+        return index >= 0 and line_no <= ends[index]
+
     def get(self):
-        return self.patched_lines
+        return self.patched_ranges
+
+
+class LintCache:
+    # Builtin linters messages of a file keyed by the git blob hash of its content (or of
+    # the part the checks read), the options affecting the messages and the diff lines
+    # being checked, and by the hash of this script, as the messages depend on the checks.
+    # A file holds one message per line as JSON, text or structured record.
+    script_digest = None
+    # Results kept in memory by the daemon, cleared when the limit is reached.
+    memory = None
+    memory_limit = 65536
+    # Results on disk older than this are removed, when results are written next to them.
+    max_age = 7 * 24 * 60 * 60
+    # Time each subdirectory was last pruned by this process, it is pruned once an hour.
+    pruned = {}
+    prune_interval = 60 * 60
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        return
+
+    @staticmethod
+    def blob_hash(data):
+        # Same as `git hash-object', without running git for every file.
+        import hashlib
+        blob = hashlib.sha1(b'blob %d\0' % len(data))
+        blob.update(data)
+        return blob.hexdigest()
+
+    @staticmethod
+    def script_hash():
+        if LintCache.script_digest is None:
+            import hashlib
+            with open(os.path.realpath(__file__), 'rb') as file:
+                LintCache.script_digest = hashlib.sha1(file.read()).hexdigest()
+        return LintCache.script_digest
+
+    def key(self, file_path, data, appended_lines):
+        options = (LintCache.script_hash(), file_path, Config.lineLengthLimit, Config.tabWidth,
+                   sorted(Config.noLintList), Config.excludeNonPrefixed, Config.outputFormat,
+                   appended_lines)
+        text = f'{LintCache.blob_hash(data)} {options!r}'
+        import hashlib
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        if LintCache.memory is not None:
+            output_lines = LintCache.memory.get(key)
+            if output_lines is not None or self.cache_dir == "":
+                return output_lines
+        import json
+        try:
+            with open(self.path(key), 'r', encoding='utf-8', newline='') as file:
+                return [json.loads(line) for line in file.read().split('\n')[:-1]]
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, output_lines):
+        if LintCache.memory is not None:
+            if len(LintCache.memory) >= LintCache.memory_limit:
+                LintCache.memory.clear()
+            LintCache.memory[key] = output_lines
+            if self.cache_dir == "":
+                return
+        # Write to a temporary file first, concurrent runs must never see partial results.
+        import json
+        path = self.path(key)
+        temp_path = f'{path}.{os.getpid()}'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            LintCache.prune(os.path.dirname(path))
+            with open(temp_path, 'w', encoding='utf-8', newline='') as file:
+                file.write(''.join(f'{json.dumps(line)}\n' for line in output_lines))
+            os.replace(temp_path, path)
+        except OSError as exception:
+            debug(f'Unable to write cache {path}: {exception}')
+        return
+
+    @staticmethod
+    def prune(directory):
+        # Diff runs key the results by the changed lines, so most of them are never looked
+        # up again. Left over temporary files go the same way.
+        now = time.time()
+        if now - LintCache.pruned.get(directory, 0.0) < LintCache.prune_interval:
+            return
+        LintCache.pruned[directory] = now
+        with contextlib.suppress(OSError), os.scandir(directory) as entries:
+            for entry in entries:
+                with contextlib.suppress(OSError):
+                    if entry.stat().st_mtime < now - LintCache.max_age:
+                        os.unlink(entry.path)
+                        Profile.count('lint.cache_pruned')
+        return
+
+
+class MessageWriter:
+    # Prints the messages as text, or as {file, line, col, check, message, in_diff} records
+    # in JSON Lines or in a SARIF log printed by close().
+    sarif_schema = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+    def __init__(self, output=None):
+        self.output = output
+        self.structured = Config.outputFormat != 'text'
+        self.results = []
+        return
+
+    @staticmethod
+    def record(file_path, line_no, column, check, message, in_diff):
+        return {'file': file_path, 'line': line_no, 'col': column, 'check': check,
+                'message': message, 'in_diff': in_diff}
+
+    @staticmethod
+    def parse_record(line, in_diff):
+        # Linter text output: `file:line:[col:] message (check)'.
+        file_path, line_no, column = None, None, None
+        match = RE_LOCATION_PREFIX.match(line)
+        if match:
+            file_path, line_no = match.group(1), int(match.group(2))
+            line = line[match.end():]
+            column, separator, rest = line.partition(':')
+            if separator and column.isdigit():
+                column, line = int(column), rest
+            else:
+                column = None
+        message = line.strip()
+        check = None
+        match = RE_CHECK_NAME.search(message)
+        if match:
+            check = match.group(1)
+            message = message[:match.start()]
+        return MessageWriter.record(file_path, line_no, column, check, message, in_diff)
+
+    def write(self, message):
+        if not self.structured:
+            print(message, file=self.output, flush=True)
+        elif Config.outputFormat == 'jsonl':
+            import json
+            print(json.dumps(message), file=self.output, flush=True)
+        else:
+            self.results.append(message)
+        return
+
+    def close(self):
+        if Config.outputFormat != 'sarif':
+            return
+        rules = sorted({result['check'] for result in self.results if result['check']})
+        results = []
+        for result in self.results:
+            sarif_result = {
+                'level': 'warning',
+                'message': {'text': result['message']},
+                'properties': {'inDiff': result['in_diff']},
+            }
+            if result['check']:
+                sarif_result['ruleId'] = result['check']
+            if result['file']:
+                region = {'startLine': max(result['line'], 1)}
+                if result['col']:
+                    region['startColumn'] = result['col']
+                sarif_result['locations'] = [{'physicalLocation': {
+                    'artifactLocation': {'uri': result['file']},
+                    'region': region,
+                }}]
+            results.append(sarif_result)
+        log = {
+            '$schema': MessageWriter.sarif_schema,
+            'version': '2.1.0',
+            'runs': [{
+                'tool': {'driver': {
+                    'name': os.path.basename(__file__),
+                    'rules': [{'id': rule} for rule in rules],
+                }},
+                'results': results,
+            }],
+        }
+        import json
+        print(json.dumps(log, indent=2), file=self.output, flush=True)
+        self.results = []
+        return
 
 
 class BuiltinLintersRunner:
-    def __init__(self, git_diff):
+    # Worker process instance, see init_worker().
+    worker = None
+
+    def __init__(self, git_diff, output=None):
         self.git_diff = git_diff
         self.file_path = ''
         self.line_index = 0
         self.line_text = ''
         self.in_imports = 0
         self.in_hdrcheck = 0
+        self.output_lines = []
+        self.writer = MessageWriter(output)
+        # process_lllcheck() bounds of the expanded line width
+        self.short_line_length = Config.lineLengthLimit // max(Config.tabWidth, 1)
+        self.tab_extra_width = max(Config.tabWidth - 1, 0)
+        self.cache = None
+        if Config.cacheDir != "" or LintCache.memory is not None:
+            self.cache = LintCache(Config.cacheDir)
         return
 
     def run(self):
         if Config.printAll:
-            self.process_all()
-            return
+            tasks = self.all_tasks()
+        else:
+            tasks = self.diff_tasks()
+        # Files are linted independently, the messages are printed in the order of the
+        # files regardless of the number of jobs.
+        with Profile.phase('lint'):
+            for output_lines in self.map_tasks(tasks):
+                if not output_lines:
+                    continue
+                if self.writer.structured:
+                    for record in output_lines:
+                        self.writer.write(record)
+                else:
+                    print('\n'.join(output_lines), file=self.writer.output)
+                Config.exitCode = 2
+            self.writer.close()
+        return
+
+    def diff_tasks(self):
         for change_set in self.git_diff.change_list:
-            self.file_path = change_set.file_path
-            self.in_imports = 0
-            self.in_hdrcheck = 0
-            need_file = False
+            if not change_set.appended_lines:
+                continue
+            appended_lines = [(line.target_line_no, line.value)
+                              for line in change_set.appended_lines]
+            yield change_set.file_path, appended_lines
+
+    @staticmethod
+    def all_tasks():
+        for file_path in GitFiles(Config.excludeFiles):
+            yield file_path, None
+
+    def map_tasks(self, tasks):
+        if Config.jobs <= 1:
+            for task in tasks:
+                yield self.process_task(task)
+            return
+        import multiprocessing
+        config = {name: value for name, value in vars(Config).items()
+                  if not name.startswith('__')}
+        with multiprocessing.Pool(Config.jobs, BuiltinLintersRunner.init_worker,
+                                  (config,)) as pool:
+            for output_lines, counters in pool.imap(BuiltinLintersRunner.run_worker, tasks,
+                                                    chunksize=4):
+                if counters:
+                    Profile.counters.update(counters)
+                yield output_lines
+        return
+
+    @staticmethod
+    def init_worker(config):
+        # Worker processes may be spawned rather than forked, restore the parsed options.
+        for name, value in config.items():
+            setattr(Config, name, value)
+        if Config.profile != "":
+            Profile.start()
+        BuiltinLintersRunner.worker = BuiltinLintersRunner(None)
+
+    @staticmethod
+    def run_worker(task):
+        output_lines = BuiltinLintersRunner.worker.process_task(task)
+        return output_lines, Profile.take_counters()
+
+    def process_task(self, task):
+        # Lint one file: only the `appended_lines' of a diff, or every line when None.
+        self.file_path, appended_lines = task
+        self.in_imports = 0
+        self.in_hdrcheck = 0
+        self.output_lines = []
+        # Submodules and files deleted from the working tree.
+        if not os.path.isfile(self.file_path):
+            return self.output_lines
+        Profile.count('lint.files')
+        with open(self.file_path, 'rb') as file:
+            if appended_lines is not None:
+                # The diff lines come with the text, the full checks need the header only.
+                return self.process_data(self.read_full_check_region(file), appended_lines)
+            if os.fstat(file.fileno()).st_size < MMAP_MIN_SIZE:
+                return self.process_data(file.read(), appended_lines)
+            import mmap
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self.process_data(data, appended_lines)
+
+    def process_data(self, data, appended_lines):
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self.file_path, data, appended_lines)
+            output_lines = self.cache.get(key)
+            if output_lines is not None:
+                debug(f'Cached: {self.file_path}')
+                Profile.count('lint.cached_files')
+                return output_lines
+        if appended_lines is None:
+            self.process_file(data, True, True)
+        else:
+            Profile.count('lint.diff_lines', len(appended_lines))
             debug(f'Runing DIFF on {self.file_path}')
-            for line in change_set.appended_lines:
-                need_file = True
-                self.line_index = line.target_line_no
-                self.line_text = line.value.rstrip('\r\n').expandtabs(Config.tabWidth)
+            for self.line_index, line_text in appended_lines:
+                self.line_text = line_text.rstrip('\r\n')
                 debug(f'Diff: {self.file_path}:{self.line_index}: {self.line_text}')
                 self.process_diff()
-            if need_file:
-                debug(f'Runing FULL on {self.file_path}')
-                self.process_file(False, True)
-        return
-
-    def process_all(self):
-        git_files = GitFiles()
-        for self.file_path in git_files.files:
-            self.file_path = self.file_path.strip()
-            self.in_imports = 0
-            self.in_hdrcheck = 0
-            if self.file_path == "":
-                continue
-            self.process_file(True, True)
-        return
+            debug(f'Runing FULL on {self.file_path}')
+            self.process_file(data, False, True)
+        if key is not None:
+            self.cache.put(key, self.output_lines)
+        return self.output_lines
 
-    def process_file(self, diff_check, full_check):
-        if os.path.isdir(self.file_path):
-            return
-        lines = open(self.file_path, 'r', encoding='utf-8').readlines()
+    @staticmethod
+    def read_full_check_region(file):
+        # The leading lines of the file process_full() looks at: the header comment and
+        # the imports block, which ends the region, as does the first other declaration.
+        # Declarations inside `/* */' comments (cgo preambles, commented out code) do not.
+        lines = []
+        in_imports = False
+        in_comment = False
+        for line in file:
+            lines.append(line)
+            starts_in_comment = in_comment
+            if in_comment or b'/*' in line:
+                in_comment = BuiltinLintersRunner.in_block_comment(line, in_comment)
+            if in_imports:
+                if line.startswith(b')'):
+                    break
+            elif line.startswith(b'import ('):
+                in_imports = True
+            elif not starts_in_comment and line.startswith(TOP_LEVEL_DECLARATIONS):
+                break
+        return b''.join(lines)
+
+    @staticmethod
+    def in_block_comment(line, in_comment):
+        # Whether a `/* */' comment is open at the end of the line.
+        index = 0
+        while True:
+            if in_comment:
+                index = line.find(b'*/', index)
+                if index < 0:
+                    return True
+                in_comment = False
+                index += 2
+            else:
+                start = line.find(b'/*', index)
+                if start < 0 or 0 <= line.find(b'//', index) < start:
+                    return False
+                in_comment = True
+                index = start + 2
+
+    def process_file(self, data, diff_check, full_check):
+        if not isinstance(data, bytes):
+            # Memory mapped, universal newlines are only handled when decoding the whole file.
+            if data.find(b'\r') < 0:
+                self.process_mapped_file(data, diff_check, full_check)
+                return
+            data = data[:]
+        # Same lines as a text mode readlines() gives, without the line ends.
+        text = data.decode('utf-8')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        lines = text.split('\n')
+        if lines[-1] == '':
+            lines.pop()
         for index, line in enumerate(lines):
             self.line_index = index + 1
-            self.line_text = line.rstrip('\r\n').expandtabs(Config.tabWidth)
+            self.line_text = line
+            debug(f'Full: {self.file_path}:{self.line_index}: {self.line_text}')
+            if diff_check:
+                self.process_diff()
+            if full_check:
+                self.process_full()
+        self.count_file_lines(len(lines), diff_check)
+        return
+
+    def process_mapped_file(self, data, diff_check, full_check):
+        # Walk the lines of the mapped file as bytes, decode only the lines some check
+        # may report on.
+        data.seek(0)
+        for self.line_index, line in enumerate(iter(data.readline, b''), 1):
+            if not self.line_may_report(line, diff_check, full_check):
+                continue
+            self.line_text = line.rstrip(b'\n').decode('utf-8')
             debug(f'Full: {self.file_path}:{self.line_index}: {self.line_text}')
             if diff_check:
                 self.process_diff()
             if full_check:
                 self.process_full()
+        self.count_file_lines(self.line_index, diff_check)
         return
 
+    @staticmethod
+    def count_file_lines(count, diff_check):
+        # Full checks stop at the imports block, the lines they skip are not counted.
+        if Profile.counters is not None and diff_check:
+            Profile.counters['lint.file_lines'] += count
+        return
+
+    def line_may_report(self, line, diff_check, full_check):
+        # Full checks only look at the lines up to the end of the imports block.
+        if full_check and (self.in_hdrcheck == 0 or self.in_imports > 0 or
+                           line.startswith(b'import (')):
+            return True
+        if not diff_check:
+            return False
+        # UTF-8 takes at least one byte per character, so the process_lllcheck() bounds
+        # hold for the byte length (with the line end) as well.
+        length = len(line)
+        if length > self.short_line_length and (
+                length + line.count(b'\t') * self.tab_extra_width > Config.lineLengthLimit):
+            return True
+        return RE_LINE_CHECKS_BYTES.search(line) is not None
+
     def process_diff(self):
         self.process_lllcheck()
-        self.process_wrapcheck()
-        self.process_declcheck()
-        self.process_deprecheck()
+        match = RE_LINE_CHECKS.search(self.line_text)
+        if not match:
+            return
+        wrap_match = None
+        wrap_rank = len(WRAPCHECK_LIST)
+        deprecated = None
+        nil_field = False
+        declaration = False
+        for match in RE_LINE_CHECKS.finditer(self.line_text, match.start()):
+            trigger = match.group()
+            if trigger == ':=':
+                declaration = True
+            elif trigger[0] == ':':
+                nil_field = True
+            else:
+                rank = WRAPCHECK_LIST.index(trigger)
+                if rank < wrap_rank:
+                    wrap_match = match
+                    wrap_rank = rank
+                if deprecated is None and trigger in DEPRECHECK_LIST:
+                    deprecated = trigger
+        if wrap_match is not None:
+            Profile.count('check.wrapcheck.lines')
+            self.process_wrapcheck(wrap_match.start())
+        if nil_field or declaration:
+            Profile.count('check.declcheck.lines')
+            self.process_declcheck(nil_field, declaration)
+        if deprecated is not None:
+            Profile.count('check.deprecheck.lines')
+            self.process_deprecheck(deprecated)
         return
 
     def process_full(self):
@@ -367,8 +1153,17 @@ class BuiltinLintersRunner:
 
     def process_lllcheck(self):
         type_id = 'lll'
+        # A tab takes at most tabWidth columns, so most lines are known to be short
+        # enough without expanding them.
         length = len(self.line_text)
-        if length > Config.lineLengthLimit and self.line_text[length-1] != '`':
+        if length <= self.short_line_length:
+            return
+        tabs = self.line_text.count('\t')
+        if length + tabs * self.tab_extra_width <= Config.lineLengthLimit:
+            return
+        if tabs > 0:
+            length = len(self.line_text.expandtabs(Config.tabWidth))
+        if length > Config.lineLengthLimit and self.line_text[-1] != '`':
             if self.file_path in ['go.mod', 'go.sum']:
                 return
             if self.is_suppressed(type_id):
@@ -377,16 +1172,8 @@ class BuiltinLintersRunner:
                                 f'({length} > {Config.lineLengthLimit})')
         return
 
-    def process_wrapcheck(self):
+    def process_wrapcheck(self, offset):
         type_id = 'wrapcheck'
-        check_list = ['fmt.'+'Error', 'errors.'+'Wrap', 'errors.'+'New', 'errors.'+'Error']
-        offset = - 1
-        for check in check_list:
-            offset = self.line_text.find(check)
-            if offset >= 0:
-                break
-        if offset < 0:
-            return False
         if self.is_suppressed(type_id):
             return
         length = len(self.line_text)
@@ -423,13 +1210,12 @@ class BuiltinLintersRunner:
             self.output_message(type_id, f'Error strings should not be capitalized: \'{word}\'')
         return
 
-    def process_declcheck(self):
+    def process_declcheck(self, nil_field, declaration):
         type_id = 'declcheck'
-        if self.line_text.replace(" ", "").find(':'+'nil') >= 0 and not self.is_suppressed(type_id):
+        if nil_field and not self.is_suppressed(type_id):
             self.output_message(type_id, 'Nil field initialization can be omitted')
             return
-        offset = self.line_text.find(':=')
-        if offset < 0:
+        if not declaration:
             return False
         if self.line_text.endswith('""') and not self.is_suppressed(type_id):
             self.output_message(type_id, 'Consider initializing an empty string with var keyword')
@@ -439,17 +1225,8 @@ class BuiltinLintersRunner:
             self.output_message(type_id, 'Explicit variable declaration should use var keyword')
         return
 
-    def process_deprecheck(self):
+    def process_deprecheck(self, check):
         type_id = 'deprecheck'
-        check_list = ['errors.'+'Wrap']
-        offset = - 1
-        check = ''
-        for check in check_list:
-            offset = self.line_text.find(check)
-            if offset >= 0:
-                break
-        if offset < 0:
-            return False
         if self.is_suppressed(type_id):
             return
         self.output_message(type_id, f'Use of method is deprecated: \'{check}\'')
@@ -499,16 +1276,24 @@ class BuiltinLintersRunner:
 
     def output_message_no_code(self, type_id, message):
         if self.is_suppressed(type_id):
+            Profile.count(f'check.{type_id}.suppressed')
             return '', False
+        Profile.count(f'check.{type_id}.emitted')
+        if self.writer.structured:
+            # Diff runs only check appended lines, --print-all runs have no diff.
+            in_diff = None if Config.printAll else True
+            self.output_lines.append(MessageWriter.record(
+                self.file_path, self.line_index, None, type_id, message, in_diff))
+            return '', True
         prefix = f'{self.file_path}:{self.line_index}: '
-        print(f'{prefix}{message} ({type_id})')
-        Config.exitCode = 2
+        self.output_lines.append(f'{prefix}{message} ({type_id})')
         return prefix, True
 
     def output_message(self, type_id, message):
         prefix, enable = self.output_message_no_code(type_id, message)
-        if enable and not Config.excludeNonPrefixed:
-            print(f'{prefix}{self.line_text} ({type_id})')
+        if enable and not Config.excludeNonPrefixed and not self.writer.structured:
+            line_text = self.line_text.expandtabs(Config.tabWidth)
+            self.output_lines.append(f'{prefix}{line_text} ({type_id})')
         return enable
 
     @staticmethod
@@ -521,24 +1306,38 @@ class BuiltinLintersRunner:
 
 
 class WarningsSuppressor:
-    def __init__(self, git_diff):
+    # Do not put more inferred paths on the `git diff' command line.
+    infer_limit = 1000
+    # Profile counters of output() exit codes
+    emitted_counters = {1: 'suppress.emitted', 2: 'suppress.emitted_in_diff',
+                        3: 'suppress.emitted_not_in_diff', 4: 'suppress.emitted_not_in_diff'}
+
+    def __init__(self, git_diff, output=None):
         self.git_diff = git_diff
         self.previous_line = ''
         self.output_next = False
+        self.writer = MessageWriter(output)
         return
 
-    def run(self):
+    def run(self, lines=None):
+        # `lines' are the already read STDIN lines, or the STDIN of a daemon request.
         have_exclude_list = Config.excludeList != ""
-        identifiers = Config.excludeList.split(',')
-        # debug(f'suppression list={identifiers}')
-        suppress_list = {}
-        for identifier in identifiers:
-            suppress_list[identifier] = True
-        patched_lines = GitPatchLines(self.git_diff).get()
-        input_lines = sys.stdin.readlines()
+        suppress_list = set(Config.excludeList.split(','))
+        # debug(f'suppression list={suppress_list}')
+        patch_lines = self.git_diff.get_patch_lines()
         self.previous_line = ''
         self.output_next = False
-        for line in input_lines:
+        # Iterate STDIN lazily, so kept warnings reach the problem matcher while
+        # the linter is still running.
+        with Profile.phase('suppress'):
+            self.process_lines(sys.stdin if lines is None else lines, patch_lines,
+                               have_exclude_list, suppress_list)
+            self.writer.close()
+        return
+
+    def process_lines(self, lines, patch_lines, have_exclude_list, suppress_list):
+        count = 0
+        for count, line in enumerate(lines, 1):
             line = line.rstrip('\r\n')
             if line == self.previous_line:
                 continue
@@ -551,22 +1350,27 @@ class WarningsSuppressor:
             words = line.split()
             if len(words) == 0:
                 continue
-            match = re.match(r'([^:]*):([0-9]+):([0-9]+):', words[0])
-            if match:
-                words[0] = f'{match.group(1)}:{match.group(2)}:'
-            if self.in_dictionary(words, patched_lines):
+            if self.in_patch(line, patch_lines):
                 self.output(line, prefixed, 2)
-            elif (Config.printAll or (
+                continue
+            if have_exclude_list:
+                # The exclude list has `file:line:' locations, without the column.
+                match = RE_LOCATION_COLUMN.match(words[0])
+                if match:
+                    words[0] = f'{match.group(1)}:{match.group(2)}:'
+            if (Config.printAll or (
                     have_exclude_list and not self.in_dictionary(words, suppress_list))):
                 if not Config.excludeNonPrefixed:
                     self.output(line + ' [not-in-diff]', prefixed, 3)
-                elif re.match(r'([^:]*):([0-9]+):', words[0]):
+                elif RE_LOCATION_PREFIX.match(words[0]):
                     self.output(line + ' [not-in-diff]', prefixed, 4)
+        Profile.count('suppress.input_lines', count)
         return
 
     def output(self, line, prefixed, exit_code):
         if self.output_skip(line):
             return
+        Profile.count(WarningsSuppressor.emitted_counters[exit_code])
         output = line
         if prefixed:
             prefixes = ['WARNING: ', 'ERROR: ']
@@ -576,7 +1380,13 @@ class WarningsSuppressor:
                     output = output.replace('\\n', '\n')
                     output = output.replace('\\r', '\n')
                     output = output.replace('\\t', '\t')
-        print(output)
+        if self.writer.structured:
+            # Continuation and `level=' lines are not known to be in the diff or not.
+            in_diff = {2: True, 3: False, 4: False}.get(exit_code)
+            output = MessageWriter.parse_record(output.removesuffix(' [not-in-diff]'), in_diff)
+            if exit_code == 1:
+                output['check'] = None
+        self.writer.write(output)
         self.previous_line = line
         self.output_next = line.endswith(':')
         Config.exitCode = exit_code
@@ -589,11 +1399,10 @@ class WarningsSuppressor:
             return False
         if not line.endswith(')'):
             return False
-        expr = r'^(.*)\s+\(\w+\)$'
-        old_match = re.match(expr, self.previous_line)
+        old_match = RE_CHECK_SUFFIX.match(self.previous_line)
         if not old_match:
             return False
-        new_match = re.match(expr, line)
+        new_match = RE_CHECK_SUFFIX.match(line)
         if not new_match:
             return False
         old_text = old_match.group(1).removesuffix(')')
@@ -606,16 +1415,348 @@ class WarningsSuppressor:
                 return True
         return False
 
+    @staticmethod
+    def infer_pathspecs(lines):
+        # Every file of the work tree in_patch() may look up, None when there are too many
+        # of them. An empty list means there is nothing to diff.
+        file_paths = set()
+        for line in lines:
+            match = RE_LOCATION_HEAD.match(line)
+            offset = 0
+            if match:
+                file_paths.add(match.group(1))
+                offset = match.end()
+            if line.find(':', offset) >= 0:
+                file_paths.update(word.group(1)
+                                  for word in RE_LOCATION_WORD.finditer(line, offset))
+            if len(file_paths) > WarningsSuppressor.infer_limit:
+                return None
+        return [f':(literal){file_path}'
+                for file_path in WarningsSuppressor.work_tree_paths(file_paths)]
 
-def main():
-    parse_arguments()
-    git_diff = GitDiff()
-    if Config.parseStdin or select.select([sys.stdin, ], [], [], 0.0)[0]:
+    @staticmethod
+    def work_tree_paths(file_paths):
+        # `git diff' fails on paths outside the work tree (GOROOT, module cache, `../x.go'),
+        # they are never in the patch anyway. Absolute paths are never in it either.
+        paths = []
+        toplevel = None
+        for file_path in sorted(file_paths):
+            if file_path == '' or os.path.isabs(file_path):
+                continue
+            file_path = os.path.normpath(file_path)
+            if file_path == '..' or file_path.startswith('../'):
+                if toplevel is None:
+                    toplevel = GitDiff.toplevel()
+                real_path = os.path.realpath(file_path)
+                if os.path.commonpath([real_path, toplevel]) != toplevel:
+                    continue
+            paths.append(file_path)
+        return paths
+
+    @staticmethod
+    def in_patch(line, patch_lines):
+        # The first word may carry a column (`file:line:column:`), the other words are
+        # only considered when they are exact `file:line:` locations.
+        offset = 0
+        match = RE_LOCATION_HEAD.match(line)
+        if match:
+            path, line_no = match.groups()
+            if patch_lines.contains(path, int(line_no)):
+                return True
+            offset = match.end()
+        if line.find(':', offset) < 0:
+            return False
+        for match in RE_LOCATION_WORD.finditer(line, offset):
+            path, line_no = match.groups()
+            if patch_lines.contains(path, int(line_no)):
+                return True
+        return False
+
+
+class RequestOutput:
+    # Client stream of a daemon request, remembers whether the output ends a line.
+    def __init__(self, stream):
+        self.stream = stream
+        self.line_ended = True
+        return
+
+    def write(self, text):
+        if text:
+            self.line_ended = text.endswith('\n')
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+        return
+
+
+class LintDaemon:
+    # Serve the requests of LintClient on a Unix socket. Parsed diffs and builtin linters
+    # results are kept between the requests. A request changes the process state (working
+    # directory, Config), so one is served at a time and the others are answered
+    # `busy', their clients run locally instead of waiting.
+    idle_timeout = 30 * 60
+
+    def __init__(self, socket_path):
+        import threading
+        self.socket_path = socket_path
+        self.git_diffs = GitDiffCache()
+        self.version = LintDaemon.scripts_version()
+        self.running = True
+        self.serving = threading.Lock()
+        return
+
+    @staticmethod
+    def scripts_version():
+        # A daemon started from other scripts than the client must not serve it.
+        scripts_dir = os.path.dirname(os.path.realpath(__file__))
+        return [os.stat(os.path.join(scripts_dir, file_name)).st_mtime_ns
+                for file_name in ['py-diff-check.py', 'py_unidiff.py', 'py_process.py']]
+
+    def run(self):
+        import socket
+        connection = LintClient.connect(self.socket_path)
+        if connection is not None:
+            connection.close()
+            debug(f'Lint daemon is already running on {self.socket_path}')
+            return
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        LintCache.memory = {}
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        try:
+            server.listen()
+            server.settimeout(LintDaemon.idle_timeout)
+            while self.running:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    if self.serving.locked():
+                        continue
+                    break
+                self.accept(connection)
+        finally:
+            server.close()
+            with contextlib.suppress(OSError):
+                os.unlink(self.socket_path)
+        return
+
+    def accept(self, connection):
+        # The request is read here, so a stale daemon stops accepting at once.
+        import json
+        import threading
+        connection.settimeout(LintClient.timeout)
+        reader = connection.makefile('rb')
+        try:
+            request = json.loads(reader.readline())
+            if request['version'] != self.version:
+                connection.sendall(b'stale\n')
+                self.running = False
+            elif not self.serving.acquire(blocking=False):
+                connection.sendall(b'busy\n')
+            else:
+                threading.Thread(target=self.serve, args=(connection, reader, request)).start()
+                return
+        except (OSError, ValueError, KeyError) as exception:
+            LintDaemon.log(f'Failed to accept lint request: {exception}')
+        reader.close()
+        connection.close()
+        return
+
+    def serve(self, connection, reader, request):
+        import io
+        connection.settimeout(None)
+        writer = io.TextIOWrapper(connection.makefile('wb'), encoding='utf-8',
+                                  line_buffering=True)
+        output = RequestOutput(writer)
+        try:
+            exit_code = self.serve_request(request, io.TextIOWrapper(reader, encoding='utf-8'),
+                                           output)
+            if exit_code is not None:
+                # The client only sees the exit code at the start of a line.
+                if not output.line_ended:
+                    output.write('\n')
+                output.write(f'\0{exit_code}\n')
+        except (OSError, ValueError, KeyError) as exception:
+            LintDaemon.log(f'Failed to serve lint request: {exception}')
+        finally:
+            with contextlib.suppress(OSError):
+                writer.close()
+            reader.close()
+            connection.close()
+            self.serving.release()
+        return
+
+    def serve_request(self, request, stdin, output):
+        # Returns the exit code, or None when the client has to run the request locally.
+        # The streams of the request are passed down, sys.stdout stays the daemon own.
+        cwd = os.getcwd()
+        try:
+            os.chdir(request['cwd'])
+            try:
+                parse_arguments(request['args'])
+            except SystemExit:
+                # The daemon output is discarded, the client reports argument errors.
+                output.write('error\n')
+                return None
+            output.write('ready\n')
+            Config.output = output
+            try:
+                Config.exitCode = 0
+                lint(self.git_diffs, stdin, output)
+                return Config.exitCode
+            except SystemExit as exception:
+                # fatal()
+                if exception.code is None:
+                    return 0
+                return exception.code if isinstance(exception.code, int) else 1
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                error(f'Lint daemon request failed: {exception}')
+                return 1
+        finally:
+            Config.output = None
+            os.chdir(cwd)
+
+    @staticmethod
+    def log(message):
+        # debug() of the daemon itself, Config.output is the stream of the served request.
+        if Config.debugLevel > 0:
+            print(f'DEBUG: {message}')
+        return
+
+
+class LintClient:
+    # Thin client of LintDaemon: forwards the arguments and STDIN, prints the output.
+    # Seconds to connect and to get the daemon answer, the request runs locally after.
+    timeout = 5.0
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        return
+
+    @staticmethod
+    def connect(socket_path):
+        import socket
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(LintClient.timeout)
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            connection.close()
+            return None
+        return connection
+
+    def run(self, args):
+        # Returns the exit code, or None when the request has to be run locally.
+        import json
+        import socket
+        import threading
+        connection = LintClient.connect(self.socket_path)
+        if connection is None:
+            self.start_daemon()
+            return None
+        with connection, connection.makefile('rb') as reader:
+            request = {'cwd': os.getcwd(), 'args': args,
+                       'version': LintDaemon.scripts_version()}
+            try:
+                connection.sendall(json.dumps(request).encode() + b'\n')
+                answer = reader.readline()
+            except OSError:
+                return None
+            if answer != b'ready\n':
+                # `busy', `stale' or `error': the daemon did not take the request.
+                debug(f'Lint daemon answered {answer!r}, running locally')
+                return None
+            connection.settimeout(None)
+            if Config.parseStdin:
+                threading.Thread(target=LintClient.forward_stdin, args=(connection,),
+                                 daemon=True).start()
+            else:
+                connection.shutdown(socket.SHUT_WR)
+            sys.stdout.flush()
+            for line in reader:
+                if line.startswith(b'\0'):
+                    return int(line[1:])
+                sys.stdout.buffer.write(line)
+                sys.stdout.buffer.flush()
+        error('Lint daemon closed the connection')
+        return 1
+
+    def start_daemon(self):
+        # The daemon outlives this run and exits on its own when idle.
+        import subprocess
+        debug(f'Starting lint daemon on {self.socket_path}')
+        with contextlib.suppress(OSError):
+            subprocess.Popen(  # pylint: disable=consider-using-with
+                [sys.executable, os.path.realpath(__file__), f'--daemon={self.socket_path}'],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True)
+        return
+
+    @staticmethod
+    def forward_stdin(connection):
+        import socket
+        with contextlib.suppress(OSError):
+            for chunk in iter(lambda: sys.stdin.buffer.read1(65536), b''):
+                connection.sendall(chunk)
+            connection.shutdown(socket.SHUT_WR)
+
+
+def lint(git_diffs=None, stdin=None, output=None):
+    # Run the selected mode, `git_diffs' is the cache of the daemon, `stdin' and `output'
+    # the streams of its request.
+    if Config.profile != "":
+        Profile.start()
+    if Config.parseStdin:
         debug('Starting WarningsSuppressor...')
-        WarningsSuppressor(git_diff).run()
+        lines = stdin
+        pathspecs = None
+        if Config.inferPathspecs and not Config.pathspecs:
+            with Profile.phase('read_input'):
+                lines = (sys.stdin if stdin is None else stdin).readlines()
+            pathspecs = WarningsSuppressor.infer_pathspecs(lines)
+            debug(f'Inferred pathspecs: {pathspecs}')
+            if pathspecs:
+                Config.pathspecs = pathspecs
+        if pathspecs == []:
+            # No file of the work tree in the output, no warning can be in the patch.
+            git_diff = GitDiff(True, [])
+        elif git_diffs is not None:
+            git_diff = git_diffs.get(True)
+        else:
+            git_diff = GitDiff(True)
+        WarningsSuppressor(git_diff, output).run(lines)
     else:
         debug('Starting BuiltinLintersRunner...')
-        BuiltinLintersRunner(git_diff).run()
+        git_diff = git_diffs.get(False) if git_diffs is not None else GitDiff()
+        BuiltinLintersRunner(git_diff, output).run()
+    if Config.profile != "":
+        Profile.report(Config.profile)
+    return
+
+
+def main():
+    import select
+    parse_arguments()
+    if Config.daemonSocket != "":
+        LintDaemon(Config.daemonSocket).run()
+        return
+    if not Config.parseStdin and select.select([sys.stdin, ], [], [], 0.0)[0]:
+        Config.parseStdin = True
+    # Profiles are of this process, not of the daemon.
+    if Config.clientSocket != "" and Config.profile == "":
+        args = sys.argv[1:] + (['--parse-stdin'] if Config.parseStdin else [])
+        exit_code = LintClient(Config.clientSocket).run(args)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    lint()
     sys.exit(Config.exitCode)
 
 
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# Copyright 2024 RnD Center "ELVEES", JSC
+
+#
+# Run `py-diff-check.py' imported as a module: the main script of an interpreter is compiled
+# on every run, an imported one is loaded from its cached bytecode. Other scripts get the
+# module as `py_diff_check_run.py_diff_check'.
+#
+
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+
+import importlib.util
+import os
+import sys
+
+
+def import_script(module_name, file_name):
+    # The script is not a valid module name, load it by path. Registered in sys.modules,
+    # worker processes look the pickled functions up there.
+    file_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), file_name)
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Loaded by spawned worker processes as well, they import the main script again.
+py_diff_check = import_script('py_diff_check', 'py-diff-check.py')
+
+
+if __name__ == '__main__':
+    py_diff_check.main()
@@ -0,0 +1,136 @@
+# Copyright 2024 RnD Center "ELVEES", JSC
+
+#
+# Subprocess runner shared by `py-diff-check.py' and `tools/getags*.py': the output of a
+# command as a whole, or streamed as lines or NUL separated records while it runs. Imported
+# as `py_process' with this directory on `sys.path'.
+#
+
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=bad-indentation
+# pylint: disable=too-few-public-methods
+
+import collections
+import subprocess
+import threading
+import time
+
+
+# Bytes read from a pipe at once
+CHUNK_SIZE = 64 * 1024
+# Only the tail of the error output is kept
+STDERR_LIMIT = 64 * 1024
+# Called as hook(params, status, seconds) for every finished process
+hooks = []
+# Called as report(message) for the lines describing a failed Shell command
+report = print
+
+
+class Process:
+    # Running command, `pipe' is its binary stdout. The error output is read aside, so the
+    # command never blocks on it, and wait() gives the status.
+    def __init__(self, params, cwd=None):
+        self.params = params
+        self.status = None
+        self.output = b''
+        self.seconds = 0.0
+        self.started = time.perf_counter()
+        self.stderr_chunks = collections.deque()
+        self.stderr_size = 0
+        self.proc = subprocess.Popen(
+            params,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self.pipe = self.proc.stdout
+        self.stderr_thread = threading.Thread(target=self.read_stderr, daemon=True)
+        self.stderr_thread.start()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wait()
+        return False
+
+    def read_stderr(self):
+        for chunk in iter(lambda: self.proc.stderr.read1(CHUNK_SIZE), b''):
+            self.stderr_chunks.append(chunk)
+            self.stderr_size += len(chunk)
+            while self.stderr_size - len(self.stderr_chunks[0]) >= STDERR_LIMIT:
+                self.stderr_size -= len(self.stderr_chunks.popleft())
+        return
+
+    def read(self, limit=None):
+        # The whole output, or its first `limit' bytes with the rest drained.
+        if limit is None:
+            return self.pipe.read()
+        data = self.pipe.read(limit)
+        while self.pipe.read1(CHUNK_SIZE):
+            pass
+        return data
+
+    def records(self, separator=b'\0', encoding='utf-8'):
+        # Records without the separator as they arrive, decoded unless `encoding' is None.
+        pending = b''
+        while True:
+            chunk = self.pipe.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            records = (pending + chunk).split(separator)
+            pending = records.pop()
+            for record in records:
+                yield record if encoding is None else record.decode(encoding)
+        if pending:
+            yield pending if encoding is None else pending.decode(encoding)
+
+    def lines(self, encoding='utf-8'):
+        return self.records(b'\n', encoding)
+
+    def wait(self):
+        if self.status is not None:
+            return self.status
+        # The consumer may stop early, do not let the command block on a full pipe.
+        self.pipe.close()
+        self.status = self.proc.wait()
+        self.stderr_thread.join()
+        self.proc.stderr.close()
+        self.seconds = time.perf_counter() - self.started
+        for hook in hooks:
+            hook(self.params, self.status, self.seconds)
+        return self.status
+
+    def succeeded(self):
+        return self.wait() == 0
+
+    @property
+    def stderr(self):
+        return b''.join(self.stderr_chunks).decode(errors='replace')
+
+
+def run(params, limit=None, cwd=None):
+    # Finished process, `output' is its stdout, or its first `limit' bytes.
+    with Process(params, cwd) as process:
+        process.output = process.read(limit)
+    return process
+
+
+class Shell:
+    # Finished command with the decoded output, a failure is reported unless `silent'.
+    def __init__(self, params, silent=False):
+        self.params = params
+        self.silent = silent
+        process = run(params)
+        self.stdout = process.output.decode()
+        self.stderr = process.stderr
+        self.status = process.status
+        if not silent and not self.succeeded():
+            report(f'Failed to execute: {self.params}')
+            report(f'{self.stderr.strip()}')
+        return
+
+    def succeeded(self):
+        return self.status == 0
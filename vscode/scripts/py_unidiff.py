@@ -87,6 +87,65 @@ class UnidiffParseError(Exception):
     """Exception when parsing the unified diff data."""
 
 
+class _Grammar(object):
+    """Regexes and literals diff lines are matched against.
+
+    The binary flavour lets the parser work on raw bytes when an encoding is
+    given: only file names and headers are decoded, line values are decoded
+    on first access.
+
+    """
+
+    def __init__(self, binary):
+        # type: (bool) -> None
+        def convert(value):
+            if not binary:
+                return value
+            if isinstance(value, basestring):
+                return value.encode('ascii')
+            return re.compile(value.pattern.encode('ascii'),
+                              value.flags & ~re.UNICODE)
+
+        self.re_source_filename = convert(RE_SOURCE_FILENAME)
+        self.re_target_filename = convert(RE_TARGET_FILENAME)
+        self.re_diff_git_header = convert(RE_DIFF_GIT_HEADER)
+        self.re_diff_git_header_uri_like = convert(RE_DIFF_GIT_HEADER_URI_LIKE)
+        self.re_diff_git_header_no_prefix = convert(RE_DIFF_GIT_HEADER_NO_PREFIX)
+        self.re_diff_git_deleted_file = convert(RE_DIFF_GIT_DELETED_FILE)
+        self.re_diff_git_new_file = convert(RE_DIFF_GIT_NEW_FILE)
+        self.re_hunk_header = convert(RE_HUNK_HEADER)
+        self.re_hunk_empty_body_line = convert(RE_HUNK_EMPTY_BODY_LINE)
+        self.re_no_newline_marker = convert(RE_NO_NEWLINE_MARKER)
+        self.re_binary_diff = convert(RE_BINARY_DIFF)
+        # every header regex is anchored to a fixed prefix, so the first
+        # character selects the only regexes the line may match
+        self.diff_git_prefix = convert('diff --git ')
+        self.deleted_file_start = convert('d')
+        self.new_file_start = convert('n')
+        self.source_filename_start = convert('-')
+        self.target_filename_start = convert('+')
+        self.hunk_header_start = convert('@')
+        self.no_newline_start = convert(LINE_TYPE_NO_NEWLINE)
+        self.binary_diff_start = convert('B')
+        self.empty_line = convert('\n')
+        self.git_binary_patch = convert('GIT binary patch\n')
+        # first character of a hunk body line to its line type
+        self.body_line_types = dict(
+            (convert(line_type), line_type)
+            for line_type in (LINE_TYPE_ADDED, LINE_TYPE_REMOVED,
+                              LINE_TYPE_CONTEXT, LINE_TYPE_NO_NEWLINE))
+        # metadata_only parsing treats empty lines as context
+        self.metadata_line_types = dict(self.body_line_types)
+        self.metadata_line_types[convert(LINE_TYPE_EMPTY)] = LINE_TYPE_CONTEXT
+
+
+def _decode(value, encoding):
+    # type: (Union[str, bytes, None], Optional[str]) -> Optional[str]
+    if encoding is None or value is None:
+        return value
+    return value.decode(encoding)
+
+
 PY2 = sys.version_info[0] == 2
 if PY2:
     import io
@@ -100,27 +159,62 @@ if PY2:
         return cls
 else:
     from io import StringIO
-    from typing import Iterable, Optional, Union
+    # The typing names are only used by the type comments, typing is slow to import.
     open_file = open
     make_str = str
     def implements_to_string(x): return x
     unicode = str
     basestring = str
 
+GRAMMAR = _Grammar(binary=False)
+# Compiled on the first parse with an encoding, empty diffs never need it.
+BINARY_GRAMMAR = None
+
+
+def _grammar(encoding):
+    # type: (Optional[str]) -> _Grammar
+    global BINARY_GRAMMAR  # pylint: disable=global-statement
+    if encoding is None:
+        return GRAMMAR
+    if BINARY_GRAMMAR is None:
+        BINARY_GRAMMAR = _Grammar(binary=True)
+    return BINARY_GRAMMAR
+
 
 @implements_to_string
 class Line(object):
     """A diff line."""
 
+    # a diff may hold millions of lines, avoid per instance __dict__
+    __slots__ = ('source_line_no', 'target_line_no', 'diff_line_no',
+                 'line_type', '_value', '_encoding')
+
     def __init__(self, value, line_type,
-                 source_line_no=None, target_line_no=None, diff_line_no=None):
-        # type: (str, str, Optional[int], Optional[int], Optional[int]) -> None
+                 source_line_no=None, target_line_no=None, diff_line_no=None,
+                 encoding=None):
+        # type: (Union[str, bytes], str, Optional[int], Optional[int], Optional[int], Optional[str]) -> None  # nolint:lll
         super(Line, self).__init__()
         self.source_line_no = source_line_no
         self.target_line_no = target_line_no
         self.diff_line_no = diff_line_no
         self.line_type = line_type
-        self.value = value
+        # with an encoding, value is raw bytes decoded on first access
+        self._value = value
+        self._encoding = encoding
+
+    @property
+    def value(self):
+        # type: () -> str
+        if self._encoding is not None:
+            self._value = self._value.decode(self._encoding)
+            self._encoding = None
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        # type: (str) -> None
+        self._value = value
+        self._encoding = None
 
     def __repr__(self):
         # type: () -> str
@@ -177,6 +271,10 @@ class PatchInfo(list):
 class Hunk(list):
     """Each of the modified blocks of a file."""
 
+    __slots__ = ('source_start', 'source_length', 'target_start',
+                 'target_length', 'section_header', '_added', '_removed',
+                 'added_ranges')
+
     def __init__(self, src_start=0, src_len=0, tgt_start=0, tgt_len=0,
                  section_header=''):
         # type: (int, int, int, int, str) -> None
@@ -192,6 +290,9 @@ class Hunk(list):
         self.section_header = section_header
         self._added = None  # Optional[int]
         self._removed = None  # Optional[int]
+        # inclusive (start, end) target ranges of non-blank added lines,
+        # only recorded when added_ranges_only switch is used
+        self.added_ranges = None  # Optional[list[tuple[int, int]]]
 
     def __repr__(self):
         # type: () -> str
@@ -216,8 +317,9 @@ class Hunk(list):
         # type: (Line) -> None
         """Append the line to hunk, and keep track of source/target lines."""
         # Make sure the line is encoded correctly. This is a no-op except for
-        # potentially raising a UnicodeDecodeError.
-        str(line)
+        # potentially raising a UnicodeDecodeError, which only Python 2 does.
+        if PY2:
+            str(line)
         super(Hunk, self).append(line)
 
     @property
@@ -300,12 +402,18 @@ class PatchedFile(list):
         hunks = ''.join(unicode(hunk) for hunk in self)
         return info + source + target + hunks
 
-    def _parse_hunk(self, header, diff, encoding, metadata_only):
-        # type: (str, enumerate[str], Optional[str], bool) -> None
+    def _parse_hunk(self, header, diff, encoding, metadata_only,
+                    added_ranges_only=False):
+        # type: (str, enumerate[str], Optional[str], bool, bool) -> Hunk
         """Parse hunk details."""
-        header_info = RE_HUNK_HEADER.match(header)
+        grammar = _grammar(encoding)
+        header_info = grammar.re_hunk_header.match(header)
         hunk_info = header_info.groups()
-        hunk = Hunk(*hunk_info)
+        hunk = Hunk(*hunk_info[:4],
+                    section_header=_decode(hunk_info[4], encoding))
+        if added_ranges_only:
+            metadata_only = True
+            hunk.added_ranges = []
 
         source_line_no = hunk.source_start
         target_line_no = hunk.target_start
@@ -313,22 +421,24 @@ class PatchedFile(list):
         expected_target_end = target_line_no + hunk.target_length
         added = 0
         removed = 0
+        metadata_line_types = grammar.metadata_line_types
+        body_line_types = grammar.body_line_types
 
         for diff_line_no, line in diff:
-            if encoding is not None:
-                line = line.decode(encoding)
-
             if metadata_only:
                 # quick line type detection, no regex required
-                line_type = line[0] if line else LINE_TYPE_CONTEXT
-                if line_type not in (LINE_TYPE_ADDED,
-                                     LINE_TYPE_REMOVED,
-                                     LINE_TYPE_CONTEXT,
-                                     LINE_TYPE_NO_NEWLINE):
+                line_type = metadata_line_types.get(line[:1])
+                if line_type is None:
                     raise UnidiffParseError(
-                        'Hunk diff line expected: %s' % line)
+                        'Hunk diff line expected: %s' % _decode(line, encoding))
 
                 if line_type == LINE_TYPE_ADDED:
+                    if added_ranges_only and line[1:].strip():
+                        ranges = hunk.added_ranges
+                        if ranges and ranges[-1][1] == target_line_no - 1:
+                            ranges[-1] = (ranges[-1][0], target_line_no)
+                        else:
+                            ranges.append((target_line_no, target_line_no))
                     target_line_no += 1
                     added += 1
                 elif line_type == LINE_TYPE_REMOVED:
@@ -342,21 +452,25 @@ class PatchedFile(list):
                 original_line = None
 
             else:
-                # parse diff line content
-                valid_line = RE_HUNK_BODY_LINE.match(line)
-                if not valid_line:
-                    valid_line = RE_HUNK_EMPTY_BODY_LINE.match(line)
+                # parse diff line content, the line type is the first
+                # character; regexes are only needed for empty or malformed
+                # lines (same results as RE_HUNK_BODY_LINE would give)
+                line_type = body_line_types.get(line[:1])
+                if line_type is not None:
+                    value = line[1:]  # type: Union[str, bytes]
+                else:
+                    valid_line = grammar.re_hunk_empty_body_line.match(line)
 
-                if not valid_line:
-                    raise UnidiffParseError(
-                        'Hunk diff line expected: %s' % line)
+                    if not valid_line:
+                        raise UnidiffParseError(
+                            'Hunk diff line expected: %s' % _decode(line, encoding))
 
-                line_type = valid_line.group('line_type')
-                if line_type == LINE_TYPE_EMPTY:
+                    # no line type character, treat like context
                     line_type = LINE_TYPE_CONTEXT
 
-                value = valid_line.group('value')  # type: str
-                original_line = Line(value, line_type=line_type)
+                    value = valid_line.group('value')  # type: Union[str, bytes]
+                original_line = Line(value, line_type=line_type,
+                                     encoding=encoding)
 
                 if line_type == LINE_TYPE_ADDED:
                     original_line.target_line_no = target_line_no
@@ -399,6 +513,7 @@ class PatchedFile(list):
             hunk._removed = removed
 
         self.append(hunk)
+        return hunk
 
     def _add_no_newline_marker_to_last_hunk(self):
         # type: () -> None
@@ -485,21 +600,13 @@ class PatchedFile(list):
 class PatchSet(list):
     """A list of PatchedFiles."""
 
-    def __init__(self, f, encoding=None, metadata_only=False):
-        # type: (Union[StringIO, str], Optional[str], bool) -> None
+    def __init__(self, f, encoding=None, metadata_only=False,
+                 added_ranges_only=False):
+        # type: (Union[StringIO, str], Optional[str], bool, bool) -> None
         super(PatchSet, self).__init__()
-
-        # convert string inputs to StringIO objects
-        if isinstance(f, basestring):
-            f = self._convert_string(f, encoding)  # type: StringIO
-
-        # make sure we pass an iterator object to parse
-        data = iter(f)
-        # if encoding is None, assume we are reading unicode data
-        # when metadata_only is True, only perform a minimal metadata parsing
-        # (ie. hunks without content) which is around 2.5-6 times faster;
-        # it will still validate the diff metadata consistency and get counts
-        self._parse(data, encoding=encoding, metadata_only=metadata_only)
+        self.extend(self.iter_files(f, encoding=encoding,
+                                    metadata_only=metadata_only,
+                                    added_ranges_only=added_ranges_only))
 
     def __repr__(self):
         # type: () -> str
@@ -509,55 +616,130 @@ class PatchSet(list):
         # type: () -> str
         return ''.join(unicode(patched_file) for patched_file in self)
 
-    def _parse(self, diff, encoding, metadata_only):
-        # type: (StringIO, Optional[str], bool) -> None
+    @classmethod
+    def iter_files(cls, f, encoding=None, metadata_only=False,
+                   added_ranges_only=False):
+        # type: (Union[StringIO, str, Iterable], Optional[str], bool, bool) -> Iterator[PatchedFile]
+        """Yield PatchedFiles as soon as they are completely parsed.
+
+        Lines are pulled from f on demand, so f may be a live pipe (e.g. the
+        stdout of a `git diff` process) and only one file is kept in memory.
+
+        """
+        # if encoding is None, assume we are reading unicode data
+        # when metadata_only is True, only perform a minimal metadata parsing
+        # (ie. hunks without content) which is around 2.5-6 times faster;
+        # it will still validate the diff metadata consistency and get counts;
+        # added_ranges_only implies metadata_only and additionally records
+        # the target line ranges of non-blank added lines in Hunk.added_ranges
+        data = cls._parse(cls._iter_input(f, encoding), encoding=encoding,
+                          metadata_only=metadata_only,
+                          added_ranges_only=added_ranges_only)
+        return (patched_file for patched_file, hunk in data if hunk is None)
+
+    @classmethod
+    def iter_hunks(cls, f, encoding=None, metadata_only=False,
+                   added_ranges_only=False):
+        # type: (Union[StringIO, str, Iterable], Optional[str], bool, bool) -> Iterator[tuple]
+        """Yield (PatchedFile, Hunk) pairs as soon as each hunk is parsed.
+
+        Hunks are not accumulated: the yielded PatchedFile only holds the
+        current hunk, so per file properties (added, removed, is_added_file,
+        ...) are not meaningful. Files without hunks are not reported.
+
+        """
+        data = cls._parse(cls._iter_input(f, encoding), encoding=encoding,
+                          metadata_only=metadata_only,
+                          added_ranges_only=added_ranges_only,
+                          keep_hunks=False)
+        return ((patched_file, hunk) for patched_file, hunk in data
+                if hunk is not None)
+
+    @classmethod
+    def _iter_input(cls, f, encoding):
+        # type: (Union[StringIO, str, Iterable], Optional[str]) -> Iterator
+        # convert string inputs to StringIO objects
+        if isinstance(f, basestring):
+            f = cls._convert_string(f, encoding)  # type: StringIO
+
+        # make sure we pass an iterator object to parse
+        return iter(f)
+
+    @staticmethod
+    def _parse(diff, encoding, metadata_only, added_ranges_only=False,
+               keep_hunks=True):
+        # type: (Iterator[str], Optional[str], bool, bool, bool) -> Iterator[tuple]
+        # yields (file, hunk) for every parsed hunk and (file, None) once
+        # the file is complete
         current_file = None
         patch_info = None
+        # the most recently started file, it is complete once the next one starts
+        last_file = None
+        # parsed items are held back until a line which can not amend them
+        # (no newline marker or trailing empty line) shows up
+        pending = []
+
+        # with an encoding lines are parsed as raw bytes, only file names and
+        # headers get decoded
+        grammar = _grammar(encoding)
 
         diff = enumerate(diff, 1)
         for unused_diff_line_no, line in diff:
-            if encoding is not None:
-                line = line.decode(encoding)
+            # every header regex is anchored to a fixed prefix, so the first
+            # character selects the only regexes the line may match
+            line_start = line[:1]
+
+            if pending and line_start != grammar.no_newline_start and \
+                    line != grammar.empty_line:
+                for item in pending:
+                    yield item
+                del pending[:]
 
             # check for a git file rename
-            is_diff_git_header = RE_DIFF_GIT_HEADER.match(line) or \
-                RE_DIFF_GIT_HEADER_URI_LIKE.match(line) or \
-                RE_DIFF_GIT_HEADER_NO_PREFIX.match(line)
+            is_diff_git_header = line.startswith(grammar.diff_git_prefix) and (
+                grammar.re_diff_git_header.match(line) or
+                grammar.re_diff_git_header_uri_like.match(line) or
+                grammar.re_diff_git_header_no_prefix.match(line))
             if is_diff_git_header:
                 patch_info = PatchInfo()
-                source_file = is_diff_git_header.group('source')
-                target_file = is_diff_git_header.group('target')
+                source_file = _decode(is_diff_git_header.group('source'), encoding)
+                target_file = _decode(is_diff_git_header.group('target'), encoding)
                 current_file = PatchedFile(
                     patch_info, source_file, target_file, None, None)
-                self.append(current_file)
-                patch_info.append(line)
+                if last_file is not None:
+                    pending.append((last_file, None))
+                last_file = current_file
+                patch_info.append(_decode(line, encoding))
                 continue
 
             # check for a git new file
-            is_diff_git_new_file = RE_DIFF_GIT_NEW_FILE.match(line)
+            is_diff_git_new_file = line_start == grammar.new_file_start and \
+                grammar.re_diff_git_new_file.match(line)
             if is_diff_git_new_file:
                 if current_file is None or patch_info is None:
                     raise UnidiffParseError(
-                        'Unexpected new file found: %s' % line)
+                        'Unexpected new file found: %s' % _decode(line, encoding))
                 current_file.source_file = DEV_NULL
-                patch_info.append(line)
+                patch_info.append(_decode(line, encoding))
                 continue
 
             # check for a git deleted file
-            is_diff_git_deleted_file = RE_DIFF_GIT_DELETED_FILE.match(line)
+            is_diff_git_deleted_file = line_start == grammar.deleted_file_start and \
+                grammar.re_diff_git_deleted_file.match(line)
             if is_diff_git_deleted_file:
                 if current_file is None or patch_info is None:
                     raise UnidiffParseError(
-                        'Unexpected deleted file found: %s' % line)
+                        'Unexpected deleted file found: %s' % _decode(line, encoding))
                 current_file.target_file = DEV_NULL
-                patch_info.append(line)
+                patch_info.append(_decode(line, encoding))
                 continue
 
             # check for source file header
-            is_source_filename = RE_SOURCE_FILENAME.match(line)
+            is_source_filename = line_start == grammar.source_filename_start and \
+                grammar.re_source_filename.match(line)
             if is_source_filename:
-                source_file = is_source_filename.group('filename')
-                source_timestamp = is_source_filename.group('timestamp')
+                source_file = _decode(is_source_filename.group('filename'), encoding)
+                source_timestamp = _decode(is_source_filename.group('timestamp'), encoding)
                 # reset current file, unless we are processing a rename
                 # (in that case, source files should match)
                 if current_file is not None and not (
@@ -568,42 +750,55 @@ class PatchSet(list):
                 continue
 
             # check for target file header
-            is_target_filename = RE_TARGET_FILENAME.match(line)
+            is_target_filename = line_start == grammar.target_filename_start and \
+                grammar.re_target_filename.match(line)
             if is_target_filename:
-                target_file = is_target_filename.group('filename')
-                target_timestamp = is_target_filename.group('timestamp')
+                target_file = _decode(is_target_filename.group('filename'), encoding)
+                target_timestamp = _decode(is_target_filename.group('timestamp'), encoding)
                 if current_file is not None and not (current_file.target_file == target_file):
-                    raise UnidiffParseError('Target without source: %s' % line)
+                    raise UnidiffParseError(
+                        'Target without source: %s' % _decode(line, encoding))
                 if current_file is None:
                     # add current file to PatchSet
                     current_file = PatchedFile(
                         patch_info, source_file, target_file,
                         source_timestamp, target_timestamp)
-                    self.append(current_file)
+                    if last_file is not None:
+                        pending.append((last_file, None))
+                    last_file = current_file
                     patch_info = None
                 else:
                     current_file.target_timestamp = target_timestamp
                 continue
 
             # check for hunk header
-            is_hunk_header = RE_HUNK_HEADER.match(line)
+            is_hunk_header = line_start == grammar.hunk_header_start and \
+                grammar.re_hunk_header.match(line)
             if is_hunk_header:
                 patch_info = None
                 if current_file is None:
-                    raise UnidiffParseError('Unexpected hunk found: %s' % line)
-                current_file._parse_hunk(line, diff, encoding, metadata_only)
+                    raise UnidiffParseError(
+                        'Unexpected hunk found: %s' % _decode(line, encoding))
+                if not keep_hunks:
+                    # keep only the last hunk, a no newline marker may follow
+                    del current_file[:]
+                hunk = current_file._parse_hunk(line, diff, encoding,
+                                                metadata_only, added_ranges_only)
+                pending.append((current_file, hunk))
                 continue
 
             # check for no newline marker
-            is_no_newline = RE_NO_NEWLINE_MARKER.match(line)
+            is_no_newline = line_start == grammar.no_newline_start and \
+                grammar.re_no_newline_marker.match(line)
             if is_no_newline:
                 if current_file is None:
-                    raise UnidiffParseError('Unexpected marker: %s' % line)
+                    raise UnidiffParseError(
+                        'Unexpected marker: %s' % _decode(line, encoding))
                 current_file._add_no_newline_marker_to_last_hunk()
                 continue
 
             # sometimes hunks can be followed by empty lines
-            if line == '\n' and current_file is not None:
+            if line == grammar.empty_line and current_file is not None:
                 current_file._append_trailing_empty_line()
                 continue
 
@@ -612,28 +807,36 @@ class PatchSet(list):
                 current_file = None
                 patch_info = PatchInfo()
 
-            is_binary_diff = RE_BINARY_DIFF.match(line)
+            is_binary_diff = line_start == grammar.binary_diff_start and \
+                grammar.re_binary_diff.match(line)
             if is_binary_diff:
-                source_file = is_binary_diff.group('source_filename')
-                target_file = is_binary_diff.group('target_filename')
-                patch_info.append(line)
+                source_file = _decode(is_binary_diff.group('source_filename'), encoding)
+                target_file = _decode(is_binary_diff.group('target_filename'), encoding)
+                patch_info.append(_decode(line, encoding))
                 if current_file is not None:
                     current_file.is_binary_file = True
                 else:
                     current_file = PatchedFile(
                         patch_info, source_file, target_file, is_binary_file=True)
-                    self.append(current_file)
+                    if last_file is not None:
+                        pending.append((last_file, None))
+                    last_file = current_file
                 patch_info = None
                 current_file = None
                 continue
 
-            if line == 'GIT binary patch\n':
+            if line == grammar.git_binary_patch:
                 current_file.is_binary_file = True
                 patch_info = None
                 current_file = None
                 continue
 
-            patch_info.append(line)
+            patch_info.append(_decode(line, encoding))
+
+        if last_file is not None:
+            pending.append((last_file, None))
+        for item in pending:
+            yield item
 
     @classmethod
     def from_filename(cls, filename, encoding=DEFAULT_ENCODING, errors=None, newline=None):
@@ -29,12 +29,17 @@ import argparse
 import functools
 import os
 import re
-import subprocess
 import sys
 import inspect
 from contextlib import ExitStack
 
 
+# Modules shared with `vscode/scripts'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'scripts'))
+import py_process  # pylint: disable=wrong-import-position
+from py_process import Shell  # pylint: disable=wrong-import-position
+
+
 class Config:
     def __init__(self):
         self.debug_level = 0
@@ -221,47 +226,19 @@ def parse_arguments():
     return arguments
 
 
-class Shell:
-    def __init__(self, params, silent=False):
-        self.params = params
-        self.silent = silent
-        proc = subprocess.Popen(
-            params,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE)
-        debug(f'Exec {params}')
-        stdout, stderr = proc.communicate()
-        self.stdout = stdout.decode()
-        self.stderr = stderr.decode()
-        self.status = proc.returncode
-        if not silent and not self.succed():
-            error(f'Failed to execute: {self.params}')
-            error(f'{self.stderr.strip()}')
-
-    def succed(self):
-        return self.status == 0
-
-    def debug(self):
-        debug(f'Shell params: {self.params}')
-        debug(f'Shell stdout: {self.stdout}')
-        debug(f'Shell stderr: {self.stderr}')
-        debug(f'Shell status: {self.status}, succed {self.succed()}')
-
-
 class GitConfig:
     def __init__(self):
         self.data = {}
-        status = Shell(['git', 'config', '--list'])
-        if not status.succed():
+        # NUL separated `key\nvalue' records, multi-line values are kept whole.
+        with py_process.Process(['git', 'config', '--list', '-z']) as process:
+            for record in process.records():
+                key, separator, value = record.partition('\n')
+                if separator:
+                    self.data[key] = value
+                    debug(f'Git configuration: key="{key}"; value="{value}"')
+        if not process.succeeded():
+            error(f'{process.stderr.strip()}')
             fatal('Unable to get Git configuration')
-        lines = status.stdout.split('\n')
-        for line in lines:
-            pos = line.find('=')
-            if pos >= 0:
-                key = line[0:pos]
-                value = line[pos+1:]
-                self.data[key] = value
-                debug(f'Git configuration: key="{key}"; value="{value}"')
         self.user_email = self.data.get('user.email', '')
         self.repository_url = self.data.get('remote.origin.url', '')
         if self.user_email == '':
@@ -275,7 +252,7 @@ class GitConfig:
         for branch_name in ['master', 'main', 'ipcam', 'ecam02', 'ecam03']:
             status = Shell(['git', 'rev-parse', '--verify',
                            branch_name], silent=True)
-            if status.succed():
+            if status.succeeded():
                 self.master_branch = branch_name
                 break
         if self.master_branch == '':
@@ -334,18 +311,18 @@ class GerritTags:
 
     def resolve_current(self):
         status = Shell(['git', 'rev-parse', 'HEAD'])
-        if not status.succed():
+        if not status.succeeded():
             fatal('Failed to obtain current revision')
         self.current_revision = status.stdout.strip()
         status = Shell(['git', 'rev-parse', '--abbrev-ref', 'HEAD'])
-        if not status.succed():
+        if not status.succeeded():
             fatal('Failed to obtain current branch name')
         self.current_branch = status.stdout.strip()
         debug(f'Curent branch {decorate(self.current_branch)} at {self.current_revision}')
 
     def remove_branches(self):
         status = Shell(['git', 'branch', '--format', '%(refname:short)'])
-        if not status.succed():
+        if not status.succeeded():
             fatal('Unable get list of actual Git branches')
         branches = status.stdout.split('\n')
         self.branch_index = 0
@@ -354,12 +331,12 @@ class GerritTags:
                 if branch_name == self.current_branch:
                     debug(f'Checking out to {self.current_revision}')
                     status = Shell(['git', 'checkout', self.current_revision])
-                    if not status.succed():
+                    if not status.succeeded():
                         fatal(f'Failed to checkout to {self.current_revision}')
                 debug(f'Deleting local branch {decorate(branch_name)}')
                 if config.unprotect_git:
                     status = Shell(['git', 'branch', '-D', branch_name])
-                    if not status.succed():
+                    if not status.succeeded():
                         fatal(f'Can not delete branch {decorate(branch_name)}')
                 self.branch_index += 1
 
@@ -367,16 +344,16 @@ class GerritTags:
         if not config.expire_unreachable:
             return
         status = Shell(['git', 'reflog', 'expire', '--expire-unreachable=all'])  # --all
-        if not status.succed():
+        if not status.succeeded():
             fatal('Unable to run Git reflog expire')
         status = Shell(['git', 'gc', '--prune=now'])
-        if not status.succed():
+        if not status.succeeded():
             fatal('Unable to run Git gc --prune=now')
         return
 
     def peek_gerrit_project(self):
         status = Shell(['git', 'remote', 'show', '-n', 'origin'])
-        if not status.succed():
+        if not status.succeeded():
             fatal('Failed to get remote repoistory configuration')
         lines = status.stdout.split('\n')
         for line in lines:
@@ -402,13 +379,13 @@ class GerritTags:
             return
         status = Shell(['git', 'checkout', '--merge',
                         '-B', self.master_branch, 'origin/'+self.master_branch])
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to checkout to {decorate(self.master_branch)}')
         status = Shell(['git', 'fetch', self.repository_url])
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to fetch from {self.repository_url}')
         status = Shell(['git', 'pull', '--rebase', '--autostash'])
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to pull {decorate(self.master_branch)} branch.')
         self.branch_index = 0
         if not self.peek_gerrit_project():
@@ -417,7 +394,7 @@ class GerritTags:
         args += [self.gerrit_host, 'gerrit', 'query', '--current-patch-set',
                  '--all-approvals', 'project:' + self.gerrit_project]
         status = Shell(args + self.filter)
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to fetch from {self.repository_url}')
         # file:///var/tmp/gerrit-project.txt
         with open('/var/tmp/gerrit-project.txt', 'w', encoding='utf-8') as project_text:
@@ -560,21 +537,16 @@ class GerritTags:
         for state in self.state_list:
             self.create_branch(state.mode, state)
         # list branches including master
-        status = Shell(['git', 'branch', '--contains', self.master_branch], True)
-        if not status.succed():
+        with py_process.Process(['git', 'branch', '--contains', self.master_branch]) as process:
+            for branch_name in process.lines():
+                if branch_name.startswith('*'):
+                    branch_name = branch_name[1:]
+                branch_name = branch_name.strip()
+                if branch_name.startswith(self.branch_prefix):
+                    self.containing_master.append(branch_name)
+        if not process.succeeded():
             fatal(f'Failed to get list of branches containing '
                   f'{decorate(self.master_branch)} branch.')
-        lines = status.stdout.split('\n')
-        line_count = len(lines)
-        line_index = 0
-        while line_index < line_count:
-            branch_name = lines[line_index]
-            line_index += 1
-            if branch_name.startswith('*'):
-                branch_name = branch_name[1:]
-            branch_name = branch_name.strip()
-            if branch_name.startswith(self.branch_prefix):
-                self.containing_master.append(branch_name)
         debug(f'Branchprefix {decorate(self.branch_prefix)}')
         debug(f'List of {decorate(self.master_branch)} branches: {self.containing_master}')
         # print table of the branches created
@@ -606,16 +578,16 @@ class GerritTags:
             branch_name += re.sub(r'[\s]', r'-', subject)
         state.branch_name = branch_name
         status = Shell(['git', 'branch', branch_name, state.revision], True)
-        if not status.succed():
+        if not status.succeeded():
             status = Shell(['git', 'fetch', self.repository_url, state.ref])
-            if not status.succed():
+            if not status.succeeded():
                 fatal(f'Failed to fetch remote {state.ref} from {self.repository_url}')
             status = Shell(['git', 'branch', branch_name, state.revision], True)
-            if not status.succed():
+            if not status.succeeded():
                 fatal(f'Failed to create branch  {decorate(branch_name)} at {state.revision}')
         status = Shell(['git', 'config', 'branch.'+branch_name + '.description',
                         state.subject], True)
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to set branch {decorate(branch_name)} description.')
 
     def rebase_branches(self):
@@ -647,7 +619,7 @@ class GerritTags:
     def rebase_state_branch_safe(self, state):
         stash_name = state.branch_name + '.stash.backup'
         status = Shell(['git', 'stash', 'push', '-m', stash_name])
-        if not status.succed():
+        if not status.succeeded():
             branch_name = decorate(state.branch_name)
             fatal(f'Failed to save stash {stash_name} while rebasing {branch_name}')
         text = status.stdout.strip()
@@ -666,7 +638,7 @@ class GerritTags:
     def rebase_state_branch_restore(self, state, stash_name):
         debug(f'Restoring local changes from stash {stash_name}')
         status = Shell(['git', 'stash', 'list'])
-        if not status.succed():
+        if not status.succeeded():
             branch_name = decorate(state.branch_name)
             fatal(f'Failed to list stashes while rebasing {branch_name}')
         pattern = r"stash@{(\d+)}.+:\s(.+)"
@@ -682,27 +654,27 @@ class GerritTags:
             branch_name = decorate(state.branch_name)
             fatal(f'Failed to retrieve index for stash {stash_name} while rebasing {branch_name}')
         status = Shell(['git', 'stash', 'apply', stash_index_found])
-        if not status.succed():
+        if not status.succeeded():
             branch_name = decorate(state.branch_name)
             fatal(f'Failed to apply stash {stash_name} while rebasing {branch_name}')
         status = Shell(['git', 'stash', 'drop', stash_index_found])
-        if not status.succed():
+        if not status.succeeded():
             branch_name = decorate(state.branch_name)
             fatal(f'Failed to drop stash {stash_name} while rebasing {branch_name}')
 
     def rebase_state_branch(self, state):
         debug(f'Running rebase on branch {state.branch_name}')
         status = Shell(['git', 'switch', state.branch_name])
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to switch to {decorate(state.branch_name)} branch')
         status = Shell(['git', 'rebase', '--update-refs', self.master_branch])
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to rebase branch {decorate(state.branch_name)}')
         text = status.stdout.strip()
         if 'is up to date' not in text and text != '':
             print(f'{text}')
         status = Shell(['git', 'push', 'origin', 'HEAD:refs/for/' + self.master_branch])
-        if not status.succed():
+        if not status.succeeded():
             fatal(f'Failed to push rebased branch {decorate(state.branch_name)}')
         text = status.stdout.strip()
         if text != '':
@@ -724,7 +696,7 @@ class GerritTags:
                 warning(f'Unable to find local branch {decorate(self.current_branch)}'
                         f' with rev {self.current_revision}')
             status = Shell(['git', 'checkout', chekout_target])
-            if not status.succed():
+            if not status.succeeded():
                 fatal(f'Failed to checkout to branch {decorate(self.current_branch)}'
                       f' revision {self.current_revision}')
 
@@ -745,7 +717,7 @@ class GerritTags:
                 debug(f'Checking out back to branch {decorate(state.branch_name)} '
                       f'revision {state.revision}')
                 status = Shell(['git', 'checkout', state.branch_name])
-                if not status.succed():
+                if not status.succeeded():
                     fatal(f'Failed to checkout to {decorate(state.branch_name)} branch')
                 return True
         return False
@@ -821,6 +793,9 @@ class GerritTags:
 
 def main():
     arguments = parse_arguments()
+    # Failed commands are reported as errors, all of them are in the debug output.
+    py_process.report = error
+    py_process.hooks.append(lambda params, status, seconds: debug(f'Exec {params}: {status}'))
     git_config = GitConfig()
     debug(f'user_email={git_config.user_email}, command={arguments.command}')
     refresh_count = 0
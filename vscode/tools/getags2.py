@@ -32,11 +32,15 @@ import json
 import os
 import re
 import shutil
-import subprocess
 import sys
 from contextlib import ExitStack
 
 
+# Modules shared with `vscode/scripts'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'scripts'))
+import py_process  # pylint: disable=wrong-import-position
+
+
 class Config:
     def __init__(self):
         self.debug_level = 0
@@ -234,26 +238,8 @@ def parse_arguments():
     return arguments
 
 
-class Shell:
-    def __init__(self, params, silent=False):
-        self.params = params
-        self.silent = silent
-        proc = subprocess.Popen(
-            params,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE)
-        debug(f'Exec {params}')
-        stdout, stderr = proc.communicate()
-        self.stdout = stdout.decode()
-        self.stderr = stderr.decode()
-        self.status = proc.returncode
-        if not silent and not self.succeeded():
-            error(f'Failed to execute: {self.params}')
-            error(f'{self.stderr.strip()}')
-
-    def succeeded(self):
-        return self.status == 0
-
+class Shell(py_process.Shell):
+    # The shared runner, which may also end the tool on a failure.
     def assert_succeeded(self, error_message):
         if self.succeeded():
             return
@@ -264,26 +250,20 @@ class Shell:
             error(f'stderr: {self.stderr}')
         fatal(f'Failed to run: {self.params}')
 
-    def debug(self):
-        debug(f'Shell params: {self.params}')
-        debug(f'Shell stdout: {self.stdout}')
-        debug(f'Shell stderr: {self.stderr}')
-        debug(f'Shell status: {self.status}, succeeded {self.succeeded()}')
-
 
 class GitConfig:
     def __init__(self):
         self.data = {}
-        status = Shell(['git', 'config', '--list'])
-        status.assert_succeeded('Unable to get Git configuration')
-        lines = status.stdout.split('\n')
-        for line in lines:
-            pos = line.find('=')
-            if pos >= 0:
-                key = line[0:pos]
-                value = line[pos+1:]
-                self.data[key] = value
-                debug(f'Git configuration: key="{key}"; value="{value}"')
+        # NUL separated `key\nvalue' records, multi-line values are kept whole.
+        with py_process.Process(['git', 'config', '--list', '-z']) as process:
+            for record in process.records():
+                key, separator, value = record.partition('\n')
+                if separator:
+                    self.data[key] = value
+                    debug(f'Git configuration: key="{key}"; value="{value}"')
+        if not process.succeeded():
+            error(f'{process.stderr.strip()}')
+            fatal('Unable to get Git configuration')
         self.user_email = self.data.get('user.email', '')
         self.repository_url = self.data.get('remote.origin.url', '')
         if self.user_email == '':
@@ -559,20 +539,17 @@ class GerritTags:
         for state in self.state_list:
             self.create_branch(state.mode, state)
         # list branches including master
-        status = Shell(['git', 'branch', '--contains', self.master_branch], True)
-        status.assert_succeeded(f'Failed to get list of branches containing '
-                                f'{decorate(self.master_branch)} branch.')
-        lines = status.stdout.split('\n')
-        line_count = len(lines)
-        line_index = 0
-        while line_index < line_count:
-            branch_name = lines[line_index]
-            line_index += 1
-            if branch_name.startswith('*'):
-                branch_name = branch_name[1:]
-            branch_name = branch_name.strip()
-            if branch_name.startswith(self.branch_prefix):
-                self.containing_master.append(branch_name)
+        with py_process.Process(['git', 'branch', '--contains', self.master_branch]) as process:
+            for branch_name in process.lines():
+                if branch_name.startswith('*'):
+                    branch_name = branch_name[1:]
+                branch_name = branch_name.strip()
+                if branch_name.startswith(self.branch_prefix):
+                    self.containing_master.append(branch_name)
+        if not process.succeeded():
+            error(f'{process.stderr.strip()}')
+            fatal(f'Failed to get list of branches containing '
+                  f'{decorate(self.master_branch)} branch.')
         debug(f'Branch prefix: {decorate(self.branch_prefix)}')
         debug(f'List of {decorate(self.master_branch)} branches: {self.containing_master}')
         # print table of the branches created
@@ -826,6 +803,9 @@ class GerritTags:
 
 def main():
     arguments = parse_arguments()
+    # Failed commands are reported as errors, all of them are in the debug output.
+    py_process.report = error
+    py_process.hooks.append(lambda params, status, seconds: debug(f'Exec {params}: {status}'))
     git_config = GitConfig()
     debug(
         f'user_email={git_config.user_email}, ' +